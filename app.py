@@ -1,52 +1,187 @@
 # pyright: reportOperatorIssue=false
 import os
+import sys
 import json
 import time
 import math
+import select
+import struct
+import ctypes
+import ctypes.util
+import queue
+import re
+import gzip
+import base64
+import csv
+import io
+import bisect
+import collections
+import fnmatch
+import functools
+import heapq
+import hmac
+import socket
+import uuid
+import zlib
+import atexit
+import contextlib
+import sqlite3
+import threading
+import multiprocessing
 import requests
-from typing import Optional, Dict, Any, cast, List
-from flask import Flask, render_template, jsonify, request
+import requests.adapters
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional, Dict, Any, cast, List, Tuple
+from flask import Flask, Response, g, has_request_context, render_template, jsonify, request, stream_with_context
 from datetime import datetime, timedelta
 
+try:
+    import brotli  # type: ignore
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack  # type: ignore
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except ImportError:
+    pa = None
+    pq = None
+
+try:
+    import orjson  # type: ignore
+    json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    json_loads = json.loads
+
 app = Flask(__name__)
-DATA_DIR = os.path.expanduser("~/.local/share/opencode/storage/message")
+DATA_DIR = os.path.expanduser(os.environ.get('OPENCODE_DATA_DIR', "~/.local/share/opencode/storage/message"))
 CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dashboard-config.json')
 
-def get_session_stats(session_path: str) -> Optional[Dict[str, Any]]:
-    session_id = os.path.basename(session_path)
-    messages = []
-    try:
-        # Read all json files in the session directory
-        files = [f for f in os.listdir(session_path) if f.endswith(".json")]
-        if not files:
-            return None
-            
-        for f in files:
-            try:
-                with open(os.path.join(session_path, f), 'r') as file:
-                    messages.append(json.load(file))
-            except Exception:
-                continue # Skip malformed files
-    except FileNotFoundError:
-        return None
+# A session counts as active if it saw activity within this window
+ACTIVE_WINDOW = timedelta(minutes=15)
 
-    if not messages:
-        return None
+# Per-session aggregate cache, keyed by session directory path.
+# Each entry holds the directory mtime, per-file (mtime, size) fingerprints,
+# the slimmed message records and the running totals, so an unchanged session
+# is served from memory and a changed one only parses new or modified files.
+_session_cache: Dict[str, Dict[str, Any]] = {}
+_session_cache_lock = threading.Lock()
 
-    # Sort by time.created
-    messages.sort(key=lambda x: x.get('time', {}).get('created', 0))
+# Instrumentation: in-process counters and latency histograms for the hot
+# path, exported in the Prometheus text format at /metrics. The stage timings
+# of a request are also sent as a Server-Timing header when
+# DASHBOARD_SERVER_TIMING is set.
+SERVER_TIMING = os.environ.get('DASHBOARD_SERVER_TIMING', '').lower() in ('1', 'true', 'yes', 'on')
+METRICS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
 
-    first_msg = messages[0]
-    last_msg = messages[-1]
+class MetricsRegistry:
+    """Labelled counters and histograms, rendered for Prometheus."""
 
-    start_time_ms = first_msg.get('time', {}).get('created', 0)
-    
-    # Try to find completion time of the last message, or use its creation time
-    end_time_ms = last_msg.get('time', {}).get('completed', last_msg.get('time', {}).get('created', start_time_ms))
-    
-    # Calculate duration
-    duration_ms = end_time_ms - start_time_ms
-    # Format duration nicely
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._kinds: Dict[str, Tuple[str, str]] = {} # name -> (type, help)
+        self._counters: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = {}
+        self._histograms: Dict[str, Dict[Tuple[Tuple[str, str], ...], List[float]]] = {}
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        self._kinds[name] = (kind, help_text)
+        (self._counters if kind == 'counter' else self._histograms).setdefault(name, {})
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters[name]
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms[name]
+            counts = series.get(key)
+            if counts is None:
+                # One slot per bucket, then +Inf, sum
+                counts = series[key] = [0] * (len(METRICS_BUCKETS) + 1) + [0.0]
+            counts[bisect.bisect_left(METRICS_BUCKETS, seconds)] += 1
+            counts[-1] += seconds
+
+    def render(self) -> str:
+        def label_str(key: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = key + extra
+            if not pairs:
+                return ''
+            escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+            return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+        lines = []
+        with self._lock:
+            for name, (kind, help_text) in self._kinds.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == 'counter':
+                    for key, value in self._counters[name].items():
+                        lines.append(f"{name}{label_str(key)} {value}")
+                    continue
+                for key, counts in self._histograms[name].items():
+                    cumulative = 0
+                    for bound, count in zip(METRICS_BUCKETS + (float('inf'),), counts):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(f"{name}_bucket{label_str(key, (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{label_str(key)} {counts[-1]}")
+                    lines.append(f"{name}_count{label_str(key)} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry()
+metrics.describe('ocmonitor_stage_seconds', 'histogram', 'Time spent per pipeline stage.')
+metrics.describe('ocmonitor_request_seconds', 'histogram', 'HTTP request latency by endpoint.')
+metrics.describe('ocmonitor_device_fetch_seconds', 'histogram', 'Remote device fetch latency.')
+metrics.describe('ocmonitor_device_fetch_total', 'counter', 'Remote device fetches by outcome.')
+metrics.describe('ocmonitor_files_parsed_total', 'counter', 'Message files read and parsed.')
+metrics.describe('ocmonitor_bytes_parsed_total', 'counter', 'Bytes of message JSON parsed.')
+metrics.describe('ocmonitor_parse_errors_total', 'counter', 'Message files skipped as unreadable or malformed.')
+metrics.describe('ocmonitor_session_cache_total', 'counter', 'Session cache lookups by result (hit, frozen, index, thaw, refresh, miss).')
+metrics.describe('ocmonitor_rollups_received_total', 'counter', 'Rollups pushed to this node by downstream nodes.')
+metrics.describe('ocmonitor_rollup_push_total', 'counter', 'Rollup pushes to upstream aggregators by status.')
+metrics.describe('ocmonitor_tail_refresh_total', 'counter', 'Active-session refreshes triggered by the fast tail check.')
+metrics.describe('ocmonitor_alerts_total', 'counter', 'Alerts fired by rule.')
+metrics.describe('ocmonitor_alert_webhook_total', 'counter', 'Alert webhook deliveries by status.')
+metrics.describe('ocmonitor_records_evicted_total', 'counter', 'Sessions whose parsed records were dropped for the memory budget.')
+
+@contextlib.contextmanager
+def timed(stage: str):
+    """Time a pipeline stage into the stage histogram and the request's Server-Timing."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.observe('ocmonitor_stage_seconds', elapsed, stage=stage)
+        if SERVER_TIMING and has_request_context():
+            timings = g.setdefault('server_timing', {})
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+def ensure_stats(container, key):
+    if key not in container:
+        container[key] = {
+            'calls': 0,
+            'success': 0,
+            'failed': 0,
+            'tool_calls': 0,
+            'length': 0,
+            'other': 0,
+            'tokens': 0,
+            'cost': 0.0
+        }
+    return container[key]
+
+def format_duration(duration_ms: float) -> Tuple[str, str]:
+    """Duration as "HH:MM:SS" and as a short human string."""
     seconds_total = int(duration_ms / 1000)
     m, s = divmod(seconds_total, 60)
     h, m = divmod(m, 60)
@@ -54,215 +189,461 @@ def get_session_stats(session_path: str) -> Optional[Dict[str, Any]]:
     duration_formatted = f"{h}h {m}m" if h > 0 else f"{m}m {s}s"
     if h == 0 and m == 0:
         duration_formatted = f"{s}s"
+    return duration_str, duration_formatted
 
-    # Get Name/Title
-    session_name = session_id # Default
-    if first_msg.get('summary') and first_msg['summary'].get('title'):
-         session_name = first_msg['summary']['title']
-    
-    # Get Model, Provider, Agent
-    model = "Unknown"
-    provider = "Unknown"
-    agent = "Unknown"
-    
-    interactions = 0
-    message_count = len(messages)
-    
-    # Project path
-    project_path = "Unknown"
-    
-    input_tokens = 0
-    output_tokens = 0
-    cache_write_tokens = 0
-    cache_read_tokens = 0
-    total_cost = 0.0
-    
-    # New metrics
-    reasoning_tokens = 0
-    files_changed = 0
-    lines_added = 0
-    lines_deleted = 0
-    
-    # Latency calculation
-    total_latency = 0
-    latency_count = 0
-    
-    models_used = {} # {model_name: {'tokens': 0, 'cost': 0}}
-    agent_stats = {}
-    model_stats = {}
-    
-    valid_token_messages = 0
-    has_cost_data = False
-    
-    # Finish reason (from last assistant message)
-    finish_reason = None
-
-    def ensure_stats(container, key):
-        if key not in container:
-            container[key] = {
-                'calls': 0,
-                'success': 0,
-                'failed': 0,
-                'tool_calls': 0,
-                'length': 0,
-                'other': 0,
-                'tokens': 0,
-                'cost': 0.0
-            }
-        return container[key]
-
-    for m in messages:
-        # Basic stats
-        if m.get('role') == 'user':
-            interactions += 1
-        elif m.get('role') == 'assistant':
-            # Check for finish reason in assistant messages
-            if 'finish' in m:
-                finish_reason = m['finish']
-            
-            # Latency
-            if m.get('time', {}).get('completed') and m.get('time', {}).get('created'):
-                latency = m['time']['completed'] - m['time']['created']
+def format_timestamp(ms: float) -> str:
+    return datetime.fromtimestamp(ms / 1000).strftime('%Y-%m-%d %H:%M:%S')
+
+class MessageRecord:
+    """The fields of one message file that the aggregation reads.
+
+    Bulky content (tool output, full text) is dropped at parse time; only a
+    short preview is kept. `tokens` is (input, output, reasoning, cache_write,
+    cache_read) and `diff` is the summary's (files, additions, deletions).
+    """
+    __slots__ = ('created', 'completed', 'role', 'model_id', 'provider_id', 'agent',
+                 'finish', 'cost', 'tokens', 'title', 'diff', 'cwd', 'error', 'preview')
+
+    def __init__(self, created: Any = 0, completed: Any = None, role: Optional[str] = None,
+                 model_id: Any = None, provider_id: Any = None, agent: Any = None, finish: Any = None,
+                 cost: Any = None, tokens: Optional[Tuple[Any, ...]] = None, title: Any = None,
+                 diff: Optional[Tuple[Any, ...]] = None, cwd: Any = None, error: bool = False,
+                 preview: Optional[str] = None) -> None:
+        self.created = created
+        self.completed = completed
+        self.role = role
+        self.model_id = model_id
+        self.provider_id = provider_id
+        self.agent = agent
+        self.finish = finish
+        self.cost = cost
+        self.tokens = tokens
+        self.title = title
+        self.diff = diff
+        self.cwd = cwd
+        self.error = error
+        self.preview = preview
+
+    def to_row(self) -> List[Any]:
+        return [getattr(self, slot) for slot in self.__slots__]
+
+    @classmethod
+    def from_row(cls, row: List[Any]) -> 'MessageRecord':
+        record = cls(*row)
+        if record.tokens is not None:
+            record.tokens = tuple(record.tokens)
+        if record.diff is not None:
+            record.diff = tuple(record.diff)
+        return record
+
+def slim_message(m: Dict[str, Any]) -> MessageRecord:
+    """Keep only the fields the aggregation reads, dropping bulky content."""
+    record = MessageRecord(role=m.get('role'), agent=m.get('agent'), finish=m.get('finish'),
+                           cost=m.get('cost'), error=bool(m.get('error')))
+
+    msg_time = m.get('time')
+    if isinstance(msg_time, dict):
+        record.created = msg_time.get('created', 0)
+        record.completed = msg_time.get('completed')
+
+    # A nested model object overrides the flat IDs
+    record.model_id = m.get('modelID')
+    record.provider_id = m.get('providerID')
+    model = m.get('model')
+    if isinstance(model, dict):
+        record.model_id = model.get('modelID', record.model_id)
+        record.provider_id = model.get('providerID', record.provider_id)
+
+    tokens = m.get('tokens')
+    if isinstance(tokens, dict):
+        cache = tokens.get('cache', {}) or {}
+        record.tokens = (
+            tokens.get('input', 0) or 0,
+            tokens.get('output', 0) or 0,
+            tokens.get('reasoning', 0) or 0,
+            cache.get('write', 0) or 0,
+            cache.get('read', 0) or 0
+        )
+    summary = m.get('summary')
+    if isinstance(summary, dict):
+        record.title = summary.get('title')
+        record.diff = (summary.get('files', 0), summary.get('additions', 0), summary.get('deletions', 0))
+    path = m.get('path')
+    if isinstance(path, dict) and 'cwd' in path:
+        record.cwd = path['cwd']
+
+    # Latest message text/summary preview
+    preview = None
+    if 'text' in m:
+        preview = m['text']
+    elif 'content' in m:
+        preview = m['content']
+    if preview is not None:
+        record.preview = preview[:200] if isinstance(preview, str) else str(preview)[:200]
+    return record
+
+def load_message(file_path: str, count: bool = True) -> Optional[MessageRecord]:
+    """Read and slim one message file; `count` is off in parse workers,
+    which must not touch the registry's lock (the parent counts for them)."""
+    try:
+        with open(file_path, 'rb') as file:
+            data = file.read()
+        m = json_loads(data)
+    except Exception:
+        if count:
+            metrics.inc('ocmonitor_parse_errors_total')
+        return None # Skip malformed files
+    if count:
+        metrics.inc('ocmonitor_files_parsed_total')
+        metrics.inc('ocmonitor_bytes_parsed_total', len(data))
+    if not isinstance(m, dict):
+        return None
+    return slim_message(m)
+
+def count_call(entry: Dict[str, Any], m: MessageRecord, tokens: int, cost: float) -> None:
+    """Count one assistant call into an agent/model stats entry."""
+    entry['calls'] += 1
+    if m.error:
+        entry['failed'] += 1
+    elif m.finish == 'stop':
+        entry['success'] += 1
+    elif m.finish == 'tool-calls':
+        entry['tool_calls'] += 1
+    elif m.finish == 'length':
+        entry['length'] += 1
+    else:
+        entry['other'] += 1
+    entry['tokens'] += tokens
+    entry['cost'] += cost
+
+def _merge_table(target: Dict[str, Any], source: Dict[str, Any]) -> None:
+    """Add a {name: {field: number}} or {name: [numbers]} table into another."""
+    for name, values in source.items():
+        current = target.get(name)
+        if current is None:
+            target[name] = dict(values) if isinstance(values, dict) else list(values)
+        elif isinstance(values, dict):
+            for field, value in values.items():
+                current[field] = current.get(field, 0) + value
+        else:
+            for i, value in enumerate(values):
+                current[i] += value
+
+class SessionAccumulator:
+    """Running totals for one session, fed one message at a time.
+
+    Messages can be added in any order: sums are commutative and the
+    order-dependent fields are kept as (order_key, value) pairs where the
+    latest key wins (the earliest for `first`). Two accumulators over
+    disjoint sets of messages merge into the same result as one over both.
+    """
+    SUM_FIELDS = ('message_count', 'interactions', 'input_tokens', 'output_tokens', 'cache_write_tokens',
+                  'cache_read_tokens', 'reasoning_tokens', 'total_cost', 'valid_token_messages',
+                  'total_latency', 'latency_count', 'files_changed', 'lines_added', 'lines_deleted')
+    LATEST_FIELDS = ('last', 'model', 'provider', 'agent', 'project_path', 'finish_reason', 'recent_tokens')
+    # {model_name: {'tokens', 'cost'}}, {name: ensure_stats()}, and the per-minute
+    # contribution to the time-series rollups: "minute_ms\tmodel\tagent" -> [tokens, cost, calls]
+    TABLE_FIELDS = ('models_used', 'agent_stats', 'model_stats', 'timeline')
+    __slots__ = ('message_count', 'interactions', 'input_tokens', 'output_tokens', 'cache_write_tokens',
+                 'cache_read_tokens', 'reasoning_tokens', 'total_cost', 'valid_token_messages',
+                 'total_latency', 'latency_count', 'files_changed', 'lines_added', 'lines_deleted',
+                 'last', 'model', 'provider', 'agent', 'project_path', 'finish_reason', 'recent_tokens',
+                 'models_used', 'agent_stats', 'model_stats', 'timeline', 'first', 'has_cost_data')
+
+    message_count: int
+    interactions: int
+    input_tokens: int
+    output_tokens: int
+    cache_write_tokens: int
+    cache_read_tokens: int
+    reasoning_tokens: int
+    total_cost: float
+    valid_token_messages: int
+    total_latency: int
+    latency_count: int
+    files_changed: int
+    lines_added: int
+    lines_deleted: int
+    # (order_key, value) pairs, None until a message sets them
+    last: Optional[Tuple[Tuple[Any, ...], MessageRecord]]
+    model: Optional[Tuple[Tuple[Any, ...], str]]
+    provider: Optional[Tuple[Tuple[Any, ...], str]]
+    agent: Optional[Tuple[Tuple[Any, ...], str]]
+    project_path: Optional[Tuple[Tuple[Any, ...], str]]
+    finish_reason: Optional[Tuple[Tuple[Any, ...], Any]]
+    recent_tokens: Optional[Tuple[Tuple[Any, ...], Dict[str, int]]]
+    models_used: Dict[str, Dict[str, Any]]
+    agent_stats: Dict[str, Dict[str, Any]]
+    model_stats: Dict[str, Dict[str, Any]]
+    timeline: Dict[str, List[Any]]
+    first: Optional[Tuple[Tuple[Any, ...], MessageRecord]]
+    has_cost_data: bool
+
+    def __init__(self) -> None:
+        for field in self.SUM_FIELDS:
+            setattr(self, field, 0)
+        self.total_cost = 0.0
+        for field in self.LATEST_FIELDS:
+            setattr(self, field, None)
+        for field in self.TABLE_FIELDS:
+            setattr(self, field, {})
+        self.first = None
+        self.has_cost_data = False
+
+    def _take_latest(self, field: str, key: Tuple[Any, ...], value: Any) -> None:
+        current = getattr(self, field)
+        if current is None or key >= current[0]:
+            setattr(self, field, (key, value))
+
+    def _take_first(self, key: Tuple[Any, ...], value: Any) -> None:
+        if self.first is None or key < self.first[0]:
+            self.first = (key, value)
+
+    def latest(self, field: str, default: Any) -> Any:
+        value = getattr(self, field)
+        return value[1] if value is not None else default
+
+    def add(self, name: str, m: MessageRecord) -> None:
+        """Fold one slimmed message, keyed by its file name, into the totals."""
+        key = (m.created or 0, name)
+        self.message_count += 1
+        self._take_latest('last', key, m)
+        self._take_first(key, m)
+
+        if m.role == 'user':
+            self.interactions += 1
+        elif m.role == 'assistant':
+            if m.finish is not None:
+                self._take_latest('finish_reason', key, m.finish)
+            if m.completed and m.created:
+                latency = m.completed - m.created
                 if latency > 0:
-                    total_latency += latency
-                    latency_count += 1
-            
-        if 'path' in m and 'cwd' in m['path']:
-            project_path = m['path']['cwd']
-            
-        if 'agent' in m:
-             agent = m['agent']
-         
-        if 'modelID' in m:
-             model = m['modelID']
-        if 'providerID' in m:
-             provider = m['providerID']
-             
-        if 'model' in m and isinstance(m['model'], dict):
-             model = m['model'].get('modelID', model)
-             provider = m['model'].get('providerID', provider)
+                    self.total_latency += latency
+                    self.latency_count += 1
+
+        if m.cwd is not None:
+            self._take_latest('project_path', key, m.cwd)
+        if m.agent is not None:
+            self._take_latest('agent', key, m.agent)
 
         msg_model = "Unknown"
-        if 'modelID' in m:
-             msg_model = m['modelID']
-        if 'model' in m and isinstance(m['model'], dict):
-             msg_model = m['model'].get('modelID', msg_model)
-             
-        # Track model usage
-        if msg_model != "Unknown":
-            if msg_model not in models_used:
-                models_used[msg_model] = {'tokens': 0, 'cost': 0.0}
-        
+        if m.model_id is not None:
+            msg_model = m.model_id
+            self._take_latest('model', key, msg_model)
+        if m.provider_id is not None:
+            self._take_latest('provider', key, m.provider_id)
+
         msg_input = 0
         msg_output = 0
         msg_cost = 0.0
-        
-        # Tokens
-        if m.get('tokens') is not None and isinstance(m['tokens'], dict):
-            valid_token_messages += 1
-            msg_input = m['tokens'].get('input', 0) or 0
-            msg_output = m['tokens'].get('output', 0) or 0
-            cache_write_tokens += m['tokens'].get('cache', {}).get('write', 0) or 0
-            cache_read_tokens += m['tokens'].get('cache', {}).get('read', 0) or 0
-            
-            # Reasoning
-            if m['tokens'].get('reasoning'):
-                reasoning_tokens += m['tokens']['reasoning']
-            
-            input_tokens += msg_input
-            output_tokens += msg_output
-        
-        if m.get('cost') is not None:
-            has_cost_data = True
-            msg_cost = m.get('cost', 0)
-        
-        total_cost += msg_cost
-        
+        if m.tokens is not None:
+            msg_input, msg_output, reasoning, cache_write, cache_read = m.tokens
+            self.valid_token_messages += 1
+            self.cache_write_tokens += cache_write
+            self.cache_read_tokens += cache_read
+            self.reasoning_tokens += reasoning
+            self.input_tokens += msg_input
+            self.output_tokens += msg_output
+            self._take_latest('recent_tokens', key, {
+                'input': msg_input,
+                'output': msg_output,
+                'cache_write': cache_write,
+                'cache_read': cache_read
+            })
+        if m.cost is not None:
+            self.has_cost_data = True
+            msg_cost = m.cost
+        self.total_cost += msg_cost
+        msg_tokens = msg_input + msg_output
+
         if msg_model != "Unknown":
-            models_used[msg_model]['tokens'] += (msg_input + msg_output)
-            models_used[msg_model]['cost'] += msg_cost
-
-        if m.get('role') == 'assistant':
-            msg_agent = m.get('agent', 'Unknown')
-            finish = m.get('finish')
-            has_msg_error = bool(m.get('error'))
-
-            agent_entry = ensure_stats(agent_stats, msg_agent)
-            agent_entry['calls'] += 1
-            if has_msg_error:
-                agent_entry['failed'] += 1
-            elif finish == 'stop':
-                agent_entry['success'] += 1
-            elif finish == 'tool-calls':
-                agent_entry['tool_calls'] += 1
-            elif finish == 'length':
-                agent_entry['length'] += 1
-            else:
-                agent_entry['other'] += 1
-            agent_entry['tokens'] += (msg_input + msg_output)
-            agent_entry['cost'] += msg_cost
-
-            model_entry = ensure_stats(model_stats, msg_model)
-            model_entry['calls'] += 1
-            if has_msg_error:
-                model_entry['failed'] += 1
-            elif finish == 'stop':
-                model_entry['success'] += 1
-            elif finish == 'tool-calls':
-                model_entry['tool_calls'] += 1
-            elif finish == 'length':
-                model_entry['length'] += 1
-            else:
-                model_entry['other'] += 1
-            model_entry['tokens'] += (msg_input + msg_output)
-            model_entry['cost'] += msg_cost
-            
-        # File changes (check latest summary)
-        if 'summary' in m and isinstance(m['summary'], dict):
-            # We take the latest summary values found? 
-            # Usually summary is cumulative or per-turn diffs?
-            # Assuming 'diffs' logic in prompt: "files_changed += msg['summary'].get('files', 0)" implies cumulative scan
-            # But normally summary is per message.
-            # Let's accumulate if it looks like a diff report
-            s = m['summary']
-            files_changed += s.get('files', 0)
-            lines_added += s.get('additions', 0)
-            lines_deleted += s.get('deletions', 0)
-
-    has_token_data = valid_token_messages > 0
+            used = self.models_used.get(msg_model)
+            if used is None:
+                used = self.models_used[msg_model] = {
+                    'tokens': 0, 'cost': 0.0, 'input': 0, 'output': 0, 'reasoning': 0, 'cache_read': 0, 'cache_write': 0
+                }
+            used['tokens'] += msg_tokens
+            used['cost'] += msg_cost
+            if m.tokens is not None:
+                used['input'] += msg_input
+                used['output'] += msg_output
+                used['reasoning'] += m.tokens[2]
+                used['cache_read'] += m.tokens[4]
+                used['cache_write'] += m.tokens[3]
+
+        msg_agent = m.agent if m.agent is not None else 'Unknown'
+        if m.role == 'assistant':
+            count_call(ensure_stats(self.agent_stats, msg_agent), m, msg_tokens, msg_cost)
+            count_call(ensure_stats(self.model_stats, msg_model), m, msg_tokens, msg_cost)
+
+        # File changes: summaries are per-turn diff reports, so accumulate them
+        if m.diff is not None:
+            files, additions, deletions = m.diff
+            self.files_changed += files
+            self.lines_added += additions
+            self.lines_deleted += deletions
+
+        # Bucket by the message's own time, so sessions spanning days are split
+        created = int(m.created or 0)
+        is_call = m.role == 'assistant'
+        if created and (is_call or msg_tokens or msg_cost):
+            bucket = f"{created - created % 60000}\t{msg_model}\t{msg_agent}"
+            point = self.timeline.get(bucket)
+            if point is None:
+                point = self.timeline[bucket] = [0, 0.0, 0]
+            point[0] += msg_tokens
+            point[1] += msg_cost
+            point[2] += 1 if is_call else 0
+
+    def merge(self, other: 'SessionAccumulator') -> 'SessionAccumulator':
+        """Fold another accumulator's messages into this one."""
+        for field in self.SUM_FIELDS:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+        self.has_cost_data = self.has_cost_data or other.has_cost_data
+        for field in self.LATEST_FIELDS:
+            if getattr(other, field) is not None:
+                key, value = getattr(other, field)
+                self._take_latest(field, key, value)
+        if other.first is not None:
+            self._take_first(*other.first)
+        for field in self.TABLE_FIELDS:
+            _merge_table(getattr(self, field), getattr(other, field))
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SessionAccumulator':
+        acc = cls()
+        for field in cls.__slots__:
+            setattr(acc, field, data[field])
+        return acc
+
+# Model registry: context window and list prices (USD per million tokens) per
+# model, loaded once from model-registry.json (or DASHBOARD_MODEL_REGISTRY).
+# Entries are glob patterns tried in order against the model id and
+# "provider/model"; results are cached per model, so classifying a session
+# costs a dict hit. Restart to pick up edits.
+MODEL_REGISTRY_FILE = os.path.expanduser(os.environ.get('DASHBOARD_MODEL_REGISTRY')
+                                         or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model-registry.json'))
+
+class ModelInfo:
+    """Context window and per-million-token prices of one registry entry."""
+    __slots__ = ('pattern', 'context_window', 'input', 'output', 'cache_read', 'cache_write')
+
+    def __init__(self, pattern: str = '*', context_window: int = 200000, input: float = 3.0, output: float = 15.0,
+                 cache_read: float = 0.3, cache_write: float = 3.75) -> None:
+        self.pattern = pattern
+        self.context_window = int(context_window)
+        self.input = float(input)
+        self.output = float(output)
+        self.cache_read = float(cache_read)
+        self.cache_write = float(cache_write)
+
+    def cost(self, usage: Dict[str, Any]) -> float:
+        """List price of an {'input', 'output', 'reasoning', 'cache_read', 'cache_write'} token count."""
+        return (usage.get('input', 0) * self.input
+                + (usage.get('output', 0) + usage.get('reasoning', 0)) * self.output
+                + usage.get('cache_read', 0) * self.cache_read + usage.get('cache_write', 0) * self.cache_write) / 1e6
+
+    def cache_savings(self, cache_read_tokens: int) -> float:
+        """What cache reads saved against paying for them as fresh input."""
+        return cache_read_tokens * (self.input - self.cache_read) / 1e6
+
+# Used for models no registry entry matches
+DEFAULT_MODEL_INFO = ModelInfo()
+
+def load_model_registry(path: str) -> List[Tuple['re.Pattern[str]', ModelInfo]]:
+    try:
+        with open(path, 'r') as f:
+            entries = json.load(f).get('models', [])
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError, AttributeError) as e:
+        app.logger.warning("Model registry %s ignored: %s", path, e)
+        return []
+    compiled = []
+    for item in entries:
+        try:
+            pattern = str(item['match'])
+            info = ModelInfo(pattern, **{k: item[k] for k in ModelInfo.__slots__[1:] if k in item})
+        except (KeyError, TypeError, ValueError) as e:
+            app.logger.warning("Model registry entry %r ignored: %s", item, e)
+            continue
+        compiled.append((re.compile(fnmatch.translate(pattern.lower())), info))
+    return compiled
+
+model_registry = load_model_registry(MODEL_REGISTRY_FILE)
+
+@functools.lru_cache(maxsize=1024)
+def model_info(model: str, provider: Optional[str] = None) -> ModelInfo:
+    model_id = model.lower()
+    qualified = f"{provider}/{model}".lower() if provider else None
+    for pattern, info in model_registry:
+        if pattern.match(model_id) or (qualified is not None and pattern.match(qualified)):
+            return info
+    return DEFAULT_MODEL_INFO
+
+def build_session_stats(session_id: str, totals: SessionAccumulator) -> Optional[Dict[str, Any]]:
+    """Turn running totals into the session dict, minus activity-relative fields."""
+    if not totals.message_count:
+        return None
+
+    if totals.first is None or totals.last is None:
+        return None
+    first_msg = totals.first[1]
+    last_msg = totals.last[1]
+
+    start_time_ms = first_msg.created
+
+    # Try to find completion time of the last message, or use its creation time
+    end_time_ms = last_msg.completed or last_msg.created or start_time_ms
+
+    # Calculate duration
+    duration_ms = end_time_ms - start_time_ms
+    seconds_total = int(duration_ms / 1000)
+    duration_str, duration_formatted = format_duration(duration_ms)
+
+    # Get Name/Title
+    session_name = session_id # Default
+    if first_msg.title:
+        session_name = first_msg.title
+
+    model = totals.latest('model', "Unknown")
+    provider = totals.latest('provider', "Unknown")
+    agent = totals.latest('agent', "Unknown")
+    project_path = totals.latest('project_path', "Unknown")
+    finish_reason = totals.latest('finish_reason', None)
+    recent_tokens = dict(totals.latest('recent_tokens', {
+        'input': 0,
+        'output': 0,
+        'cache_write': 0,
+        'cache_read': 0
+    }))
+
+    input_tokens = totals.input_tokens
+    output_tokens = totals.output_tokens
+    cache_read_tokens = totals.cache_read_tokens
+    reasoning_tokens = totals.reasoning_tokens
+    total_cost = totals.total_cost
+    files_changed = totals.files_changed
 
     # Format models_used for frontend
     models_list = []
-    for m_name, data in models_used.items():
+    for m_name, data in totals.models_used.items():
         models_list.append({
             'name': m_name,
             'tokens': data['tokens'],
             'cost': f"${data['cost']:.2f}"
         })
 
-    # Recent tokens
-    recent_tokens = {
-        'input': 0,
-        'output': 0,
-        'cache_write': 0,
-        'cache_read': 0
-    }
-    
-    # Find last message with valid tokens
-    for m in reversed(messages):
-        if m.get('tokens') is not None and isinstance(m['tokens'], dict):
-            recent_tokens['input'] = m['tokens'].get('input', 0) or 0
-            recent_tokens['output'] = m['tokens'].get('output', 0) or 0
-            recent_tokens['cache_write'] = m['tokens'].get('cache', {}).get('write', 0) or 0
-            recent_tokens['cache_read'] = m['tokens'].get('cache', {}).get('read', 0) or 0
-            break
-
     # Calculate tokens per minute
     minutes = duration_ms / 1000 / 60
     tokens_per_minute = 0
     if minutes > 0:
         tokens_per_minute = int((input_tokens + output_tokens) / minutes)
-        
+
     rate_level = "LOW"
     if tokens_per_minute > 50000:
         rate_level = "HIGH"
@@ -273,16 +654,12 @@ def get_session_stats(session_path: str) -> Optional[Dict[str, Any]]:
     # 1. Current Turn Context (What actually hits the window limit)
     # The context sent to model in the latest interaction
     current_turn_context = recent_tokens['input'] + recent_tokens['cache_read']
-    
+
     # 2. Total Accumulated Context (Historical usage sum)
     total_accumulated_context = input_tokens + cache_read_tokens
-    
-    context_window = 200000 # Default
-    if 'gemini' in model.lower() and 'pro' in model.lower():
-         context_window = 2000000
-    elif 'claude' in model.lower():
-         context_window = 200000
-    
+
+    context_window = model_info(model, provider).context_window
+
     context_percentage = 0
     if context_window > 0:
         # Progress bar based on CURRENT turn usage vs Limit
@@ -296,71 +673,36 @@ def get_session_stats(session_path: str) -> Optional[Dict[str, Any]]:
     max_duration_seconds = 5 * 3600
     time_percentage = min(100, int((seconds_total / max_duration_seconds) * 100))
 
-    # Extract latest message text/summary
-    latest_message_preview = "No content"
-    if 'text' in last_msg:
-         latest_message_preview = last_msg['text']
-    elif 'content' in last_msg:
-         latest_message_preview = last_msg['content']
-    
-    if isinstance(latest_message_preview, str):
-        latest_message_preview = latest_message_preview[:200]
-    else:
-        latest_message_preview = str(latest_message_preview)[:200]
-
-    # Check for errors
-    has_error = False
-    if last_msg.get('error'):
-        has_error = True
-
-    # Determine status
-    last_activity_ms = end_time_ms
-    last_activity_dt = datetime.fromtimestamp(last_activity_ms / 1000)
-    now = datetime.now()
-    is_recent = (now - last_activity_dt) < timedelta(minutes=15)
-    
-    status = "Completed"
-    last_role = last_msg.get('role', '')
-    last_completed = last_msg.get('time', {}).get('completed')
-    
-    if is_recent:
-        if last_role == 'user':
-            status = "Active"
-        elif last_role == 'assistant' and not last_completed:
-            status = "Active"
-    
-    # Time since last activity friendly string
-    delta = now - last_activity_dt
-    seconds_since_activity = int(delta.total_seconds())
-    if delta.days > 0:
-        time_since = f"{delta.days}天前"
-    elif delta.seconds > 3600:
-        time_since = f"{delta.seconds // 3600}小时前"
-    elif delta.seconds > 60:
-        time_since = f"{delta.seconds // 60}分钟前"
-    else:
-        time_since = f"{delta.seconds}秒前"
-
     # Last message duration
     last_msg_duration_ms = 0
-    if last_msg.get('time', {}).get('completed') and last_msg.get('time', {}).get('created'):
-         last_msg_duration_ms = last_msg['time']['completed'] - last_msg['time']['created']
+    if last_msg.completed and last_msg.created:
+        last_msg_duration_ms = last_msg.completed - last_msg.created
     last_msg_duration_s = int(last_msg_duration_ms / 1000)
 
     # Derived Metrics
-    avg_latency = (total_latency / latency_count / 1000) if latency_count > 0 else 0
-    
+    latency_count = totals.latency_count
+    avg_latency = (totals.total_latency / latency_count / 1000) if latency_count > 0 else 0
+
     cache_hit_rate = 0
     if (input_tokens + cache_read_tokens) > 0:
         cache_hit_rate = int((cache_read_tokens / (input_tokens + cache_read_tokens)) * 100)
-    
-    # Savings: Assuming generic ~$3/M input vs $0.3/M cache -> saving $2.7 per M
-    # This is a rough estimation for visualization
-    cache_savings = (cache_read_tokens / 1000000) * 2.7
+
+    # Cache savings and the list-price cost, per model from the registry;
+    # tokens of messages without a model id are priced as the session model
+    cache_savings = 0.0
+    estimated_cost = 0.0
+    priced_cache_read = 0
+    for m_name, data in totals.models_used.items():
+        info = model_info(m_name, provider)
+        cache_savings += info.cache_savings(data['cache_read'])
+        estimated_cost += info.cost(data)
+        priced_cache_read += data['cache_read']
+    if cache_read_tokens > priced_cache_read:
+        cache_savings += model_info(model, provider).cache_savings(cache_read_tokens - priced_cache_read)
 
     return {
         "id": session_id,
-        "started": datetime.fromtimestamp(start_time_ms / 1000).strftime('%Y-%m-%d %H:%M:%S'),
+        "started": format_timestamp(start_time_ms),
         "timestamp": start_time_ms,
         "duration": duration_str,
         "duration_formatted": duration_formatted,
@@ -368,16 +710,14 @@ def get_session_stats(session_path: str) -> Optional[Dict[str, Any]]:
         "model": model,
         "provider": provider,
         "agent": agent,
-        "status": status,
-        "message_count": message_count,
+        "message_count": totals.message_count,
         "project_path": project_path,
-        "last_activity": datetime.fromtimestamp(last_activity_ms / 1000).strftime('%Y-%m-%d %H:%M:%S'),
-        "time_since_activity": time_since,
-        "seconds_since_activity": seconds_since_activity,
-        "interactions": interactions,
+        "last_activity": format_timestamp(end_time_ms),
+        "last_activity_ms": end_time_ms,
+        "interactions": totals.interactions,
         "input_tokens": input_tokens,
         "output_tokens": output_tokens,
-        "cache_write_tokens": cache_write_tokens,
+        "cache_write_tokens": totals.cache_write_tokens,
         "cache_read_tokens": cache_read_tokens,
         "total_tokens": input_tokens + output_tokens,
         "recent_tokens": recent_tokens,
@@ -394,13 +734,14 @@ def get_session_stats(session_path: str) -> Optional[Dict[str, Any]]:
         "time_percentage": time_percentage,
         "cost": f"${total_cost:.4f}",
         "cost_val": total_cost,
-        "latest_preview": latest_message_preview,
-        "has_error": has_error,
+        "estimated_cost_val": estimated_cost,
+        "latest_preview": last_msg.preview if last_msg.preview is not None else "No content",
+        "has_error": last_msg.error,
         "latest_duration": f"{last_msg_duration_s}s",
         "models_used": models_list,
-        "has_token_data": has_token_data,
-        "has_cost_data": has_cost_data,
-        
+        "has_token_data": totals.valid_token_messages > 0,
+        "has_cost_data": totals.has_cost_data,
+
         # New Metrics
         "avg_latency": f"{avg_latency:.1f}",
         "has_latency": avg_latency > 0,
@@ -410,221 +751,3075 @@ def get_session_stats(session_path: str) -> Optional[Dict[str, Any]]:
         "reasoning_tokens": reasoning_tokens,
         "has_reasoning": reasoning_tokens > 0,
         "files_changed": files_changed,
-        "lines_added": lines_added,
-        "lines_deleted": lines_deleted,
+        "lines_added": totals.lines_added,
+        "lines_deleted": totals.lines_deleted,
         "has_file_changes": files_changed > 0,
         "finish_reason": finish_reason,
-        "agent_stats": agent_stats,
-        "model_stats": model_stats
+        # Copies, since the running totals keep being folded into
+        "agent_stats": {k: dict(v) for k, v in totals.agent_stats.items()},
+        "model_stats": {k: dict(v) for k, v in totals.model_stats.items()},
+
+        # Kept for recomputing status without reparsing
+        "_last_role": last_msg.role or '',
+        "_last_completed": last_msg.completed
     }
 
-def load_config() -> Dict[str, Any]:
-    if not os.path.exists(CONFIG_FILE):
-        return {"devices": []}
-    try:
-        with open(CONFIG_FILE, 'r') as f:
-            return json.load(f)
-    except Exception:
-        return {"devices": []}
+def is_recent_activity(base: Dict[str, Any], now: Optional[datetime] = None) -> bool:
+    return (now or datetime.now()) - datetime.fromtimestamp(base['last_activity_ms'] / 1000) < ACTIVE_WINDOW
 
-def fetch_remote_sessions(device_url: str) -> Optional[Dict[str, Any]]:
+def set_time_since_fields(stats: Dict[str, Any], last_activity_ms: float, now: datetime) -> None:
+    """Fill in the clock-driven seconds/time since last activity fields."""
+    # Time since last activity friendly string
+    delta = now - datetime.fromtimestamp(last_activity_ms / 1000)
+    stats['seconds_since_activity'] = int(delta.total_seconds())
+    if delta.days > 0:
+        stats['time_since_activity'] = f"{delta.days}天前"
+    elif delta.seconds > 3600:
+        stats['time_since_activity'] = f"{delta.seconds // 3600}小时前"
+    elif delta.seconds > 60:
+        stats['time_since_activity'] = f"{delta.seconds // 60}分钟前"
+    else:
+        stats['time_since_activity'] = f"{delta.seconds}秒前"
+
+def apply_activity_fields(base: Dict[str, Any], now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Return a copy of cached stats with status and time-since fields for `now`."""
+    stats = {k: v for k, v in base.items() if not k.startswith('_')}
+    now = now or datetime.now()
+    last_activity_dt = datetime.fromtimestamp(base['last_activity_ms'] / 1000)
+    is_recent = (now - last_activity_dt) < ACTIVE_WINDOW
+
+    # Determine status
+    status = "Completed"
+    last_role = base['_last_role']
+    if is_recent:
+        if last_role == 'user':
+            status = "Active"
+        elif last_role == 'assistant' and not base['_last_completed']:
+            status = "Active"
+    stats['status'] = status
+
+    set_time_since_fields(stats, base['last_activity_ms'], now)
+    return stats
+
+def _scan_session_files(session_path: str) -> Optional[Dict[str, Tuple[int, int]]]:
     try:
-        response = requests.get(f"{device_url}/api/sessions", timeout=3)
-        if response.status_code == 200:
-            return response.json()
-    except Exception:
-        pass
-    return None
+        with os.scandir(session_path) as entries:
+            files = {}
+            for entry in entries:
+                if entry.name.endswith(".json"):
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    files[entry.name] = (st.st_mtime_ns, st.st_size)
+            return files
+    except (FileNotFoundError, NotADirectoryError):
+        return None
 
-@app.route('/')
-def index():
-    return render_template('index.html')
+def refresh_session_entry(session_path: str, entry: Optional[Dict[str, Any]], dir_mtime: int,
+                          files: Optional[Dict[str, Tuple[int, int]]] = None) -> Optional[Dict[str, Any]]:
+    """Up-to-date copy of a cache entry, parsing only new or modified files.
 
-@app.route('/api/devices')
-def get_devices():
-    config = load_config()
-    return jsonify({"devices": config.get("devices", [])})
+    `files` is a fresh _scan_session_files result when the caller already
+    has one. `entry` is returned as is when no file changed and is never
+    mutated, so this runs without the cache lock and the result is
+    installed afterwards.
+    """
+    if files is None:
+        files = _scan_session_files(session_path)
+    if files is None:
+        return None
+    if entry is None:
+        entry = {'dir_mtime': None, 'files': {}, 'records': {}, 'totals': SessionAccumulator(), 'stats': None}
 
-@app.route('/api/sessions')
-def sessions():
-    sessions_data = []
-    overall_agent_stats = {}
-    overall_model_stats = {}
-
-    def to_int(value: object) -> int:
-        if isinstance(value, bool):
-            return int(value)
-        if isinstance(value, (int, float)):
-            return int(value)
-        if isinstance(value, str):
-            try:
-                return int(float(value))
-            except ValueError:
-                return 0
-        return 0
+    old_files = entry['files']
+    records = entry['records']
+    changed = [name for name, fp in files.items() if old_files.get(name) != fp]
+    removed = [name for name in old_files if name not in files]
+    if not changed and not removed and entry['dir_mtime'] is not None:
+        return entry
 
-    def to_float(value: object) -> float:
-        if isinstance(value, bool):
-            return float(value)
-        if isinstance(value, (int, float)):
-            return float(value)
-        if isinstance(value, str):
-            try:
-                return float(value)
-            except ValueError:
-                return 0.0
-        return 0.0
+    rebuild = bool(removed) or any(name in old_files for name in changed)
+    if rebuild and records is None:
+        # Entries restored from the on-disk index carry totals but no
+        # per-file records, so an in-place change means a full reparse.
+        records = {}
+        changed = list(files)
 
-    def is_recent(timestamp_val: object, today_start_ts_val: int) -> bool:
-        if isinstance(timestamp_val, bool):
-            return int(timestamp_val) > today_start_ts_val
-        if isinstance(timestamp_val, (int, float)):
-            return int(timestamp_val) > today_start_ts_val
-        if isinstance(timestamp_val, str):
-            try:
-                return int(float(timestamp_val)) > today_start_ts_val
-            except ValueError:
-                return False
-        return False
+    new_records = {}
+    for name in changed:
+        record = load_message(os.path.join(session_path, name))
+        if record is not None:
+            new_records[name] = record
+    if records is not None:
+        stale = set(changed)
+        records = {name: record for name, record in records.items() if name in files and name not in stale}
+        records.update(new_records)
 
-    def merge_stats(target, source):
-        for key, stats in source.items():
-            if key not in target:
-                target[key] = {
-                    'calls': 0,
-                    'success': 0,
-                    'failed': 0,
-                    'tool_calls': 0,
-                    'length': 0,
-                    'other': 0,
-                    'tokens': 0,
-                    'cost': 0.0
-                }
-            calls = to_int(stats.get('calls'))
-            success = to_int(stats.get('success'))
-            failed = to_int(stats.get('failed'))
-            tool_calls = to_int(stats.get('tool_calls'))
-            length = to_int(stats.get('length'))
-            other = to_int(stats.get('other'))
-            tokens = to_int(stats.get('tokens'))
-            cost = to_float(stats.get('cost'))
-
-            target_entry = target[key]
-            if not isinstance(target_entry, dict):
-                continue
+    if rebuild:
+        # A file changed in place: its old contribution is unknown to the
+        # running totals, so rebuild them from the cached records (no I/O).
+        assert records is not None
+        totals = SessionAccumulator()
+        for name, record in records.items():
+            totals.add(name, record)
+    else:
+        totals = SessionAccumulator().merge(entry['totals'])
+        for name, record in new_records.items():
+            totals.add(name, record)
 
-            entry_calls = to_int(target_entry.get('calls')) or 0
-            entry_success = to_int(target_entry.get('success')) or 0
-            entry_failed = to_int(target_entry.get('failed')) or 0
-            entry_tool_calls = to_int(target_entry.get('tool_calls')) or 0
-            entry_length = to_int(target_entry.get('length')) or 0
-            entry_other = to_int(target_entry.get('other')) or 0
-            entry_tokens = to_int(target_entry.get('tokens')) or 0
-            entry_cost = to_float(target_entry.get('cost')) or 0.0
-
-            if isinstance(calls, int):
-                target_entry['calls'] = entry_calls + calls
-            if isinstance(success, int):
-                target_entry['success'] = entry_success + success
-            if isinstance(failed, int):
-                target_entry['failed'] = entry_failed + failed
-            if isinstance(tool_calls, int):
-                target_entry['tool_calls'] = entry_tool_calls + tool_calls
-            if isinstance(length, int):
-                target_entry['length'] = entry_length + length
-            if isinstance(other, int):
-                target_entry['other'] = entry_other + other
-            if isinstance(tokens, int):
-                target_entry['tokens'] = entry_tokens + tokens
-            if isinstance(cost, (int, float)):
-                target_entry['cost'] = float(entry_cost) + float(cost)
-    
-    # Daily aggregation
-    today_start: datetime = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    today_start_ts: int = int(today_start.timestamp() * 1000)
-    
-    today_cost: float = 0.0
-    today_tokens: int = 0
-    active_count: int = 0
-    by_device_stats = {}
-    
-    config = load_config()
-    devices = config.get('devices', [])
-    
-    for device in devices:
-        if not device.get('enabled', True):
-            continue
-            
-        device_id = device.get('id', 'unknown')
-        device_name = device.get('name', device_id)
-        device_url = device.get('url', '')
-        
-        if device_url == 'local':
-            by_device_stats[device_id] = {'name': device_name, 'sessions': 0, 'cost': 0.0, 'tokens': 0, 'active': 0}
-        else:
-            remote_data = fetch_remote_sessions(device_url)
-            if remote_data:
-                remote_sessions = remote_data.get('sessions', [])
-                for session in remote_sessions:
-                    session['device_id'] = device_id
-                    session['device_name'] = device_name
-                    sessions_data.append(session)
-                    
-                    merge_stats(overall_agent_stats, session.get('agent_stats', {}))
-                    merge_stats(overall_model_stats, session.get('model_stats', {}))
-                    
-                    if session.get('status') == 'Active':
-                        active_count += 1
-                    
-                    if is_recent(session.get('timestamp'), today_start_ts):
-                        today_cost += to_float(session.get('cost_val'))
-                        today_tokens += to_int(session.get('total_tokens'))
-    
-    if os.path.exists(DATA_DIR):
-        try:
-            session_dirs = [d for d in os.listdir(DATA_DIR) if d.startswith('ses_')]
-            
-            for d in session_dirs:
-                path = os.path.join(DATA_DIR, d)
-                if os.path.isdir(path):
-                    stats = get_session_stats(path)
-                    if isinstance(stats, dict):
-                        stats_dict: Dict[str, Any] = stats
-                        stats_dict['device_id'] = 'local'
-                        stats_dict['device_name'] = '本地设备'
-                        sessions_data.append(stats_dict)
-
-                        merge_stats(overall_agent_stats, stats_dict.get('agent_stats', {}))
-                        merge_stats(overall_model_stats, stats_dict.get('model_stats', {}))
-                        
-                        stats_status = stats_dict.get('status')
-                        if stats_status == 'Active':
-                            active_count += 1
-                        
-                        if is_recent(stats_dict.get('timestamp'), today_start_ts):
-                            stats_cost_val: float = to_float(stats_dict.get('cost_val'))
-                            today_cost = float(today_cost) + stats_cost_val
-
-                            stats_tokens_val: int = to_int(stats_dict.get('total_tokens'))
-                            today_tokens = int(today_tokens) + stats_tokens_val
+    return {
+        'dir_mtime': dir_mtime,
+        'files': files,
+        'records': records,
+        'totals': totals,
+        'stats': build_session_stats(os.path.basename(session_path), totals),
+        'timeline_applied': False
+    }
 
-        except Exception as e:
-            return jsonify({"error": str(e)})
+# Time-series rollups of tokens, cost and calls in minute/hour/day buckets,
+# keyed by (model, agent, project, device). Each session's per-minute
+# timeline is applied as a unit: when it changes the old contribution is
+# subtracted and the new one added, so the rollups never need a rescan.
+TIMESERIES_RESOLUTIONS = ('minute', 'hour', 'day')
+TIMESERIES_DIMENSIONS = ('model', 'agent', 'project', 'device')
+TIMESERIES_RETENTION = {
+    'minute': float(os.environ.get('DASHBOARD_TIMESERIES_MINUTE_HOURS', '48')) * 3600000,
+    'hour': float(os.environ.get('DASHBOARD_TIMESERIES_HOUR_DAYS', '90')) * 86400000,
+    'day': None
+}
+TIMESERIES_DEFAULT_SPAN = {'minute': 2 * 3600000, 'hour': 7 * 86400000, 'day': 90 * 86400000}
 
-    # Sort by timestamp descending (newest first)
+@functools.lru_cache(maxsize=4096)
+def local_day_start(hour_ms: int) -> int:
+    """Local midnight for the day containing the given (hour-aligned) time."""
+    day = datetime.fromtimestamp(hour_ms / 1000).replace(hour=0, minute=0, second=0, microsecond=0)
+    return int(day.timestamp() * 1000)
+
+def bucket_start(resolution: str, minute_ms: int) -> int:
+    if resolution == 'minute':
+        return minute_ms
+    hour_ms = minute_ms - minute_ms % 3600000
+    return hour_ms if resolution == 'hour' else local_day_start(hour_ms)
+
+class TimeseriesRollup:
+    """Incrementally maintained minute/hour/day rollups."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # resolution -> bucket start -> (model, agent, project, device) -> [tokens, cost, calls]
+        self._buckets: Dict[str, Dict[int, Dict[Tuple[str, str, str, str], List[float]]]] = {
+            res: {} for res in TIMESERIES_RESOLUTIONS
+        }
+        self._applied: Dict[str, Tuple[Dict[str, List[float]], str, str]] = {}
+        self._last_prune = 0.0
+
+    def _add(self, timeline: Dict[str, List[float]], project: str, device: str, sign: int) -> None:
+        for key, (tokens, cost, calls) in timeline.items():
+            minute, model, agent = key.split('\t', 2)
+            minute_ms = int(minute)
+            dims = (model, agent, project, device)
+            for res in TIMESERIES_RESOLUTIONS:
+                series = self._buckets[res].get(bucket_start(res, minute_ms))
+                if series is None:
+                    if sign < 0:
+                        continue # already pruned
+                    series = self._buckets[res][bucket_start(res, minute_ms)] = {}
+                point = series.get(dims)
+                if point is None:
+                    if sign < 0:
+                        continue
+                    point = series[dims] = [0, 0.0, 0]
+                point[0] += sign * tokens
+                point[1] += sign * cost
+                point[2] += sign * calls
+                if sign < 0 and point[0] <= 0 and point[2] <= 0 and abs(point[1]) < 1e-9:
+                    del series[dims]
+
+    def apply(self, source: str, timeline: Dict[str, List[float]], project: str, device: str = 'local') -> None:
+        """Replace the contribution of one session (or other source)."""
+        snapshot = {key: list(point) for key, point in timeline.items()}
+        with self._lock:
+            previous = self._applied.pop(source, None)
+            if previous is not None:
+                self._add(*previous, sign=-1)
+            self._add(snapshot, project, device, sign=1)
+            self._applied[source] = (snapshot, project, device)
+            if time.monotonic() - self._last_prune > 60:
+                self._prune()
+
+    def remove(self, source: str) -> None:
+        with self._lock:
+            previous = self._applied.pop(source, None)
+            if previous is not None:
+                self._add(*previous, sign=-1)
+
+    def release(self, source: str) -> None:
+        """Keep a source's contribution in the buckets but drop its snapshot.
+
+        Used for frozen sessions, whose timelines stay in the index; `adopt`
+        hands the snapshot back before the contribution is replaced or removed.
+        """
+        with self._lock:
+            self._applied.pop(source, None)
+
+    def adopt(self, source: str, timeline: Dict[str, List[float]], project: str, device: str = 'local') -> None:
+        snapshot = {key: list(point) for key, point in timeline.items()}
+        with self._lock:
+            self._applied[source] = (snapshot, project, device)
+
+    def _prune(self) -> None:
+        self._last_prune = time.monotonic()
+        now_ms = time.time() * 1000
+        for res, retention in TIMESERIES_RETENTION.items():
+            if retention is None:
+                continue
+            buckets = self._buckets[res]
+            for start in [s for s in buckets if s < now_ms - retention]:
+                del buckets[start]
+
+    def query(self, resolution: str, start_ms: float, end_ms: float, group_by: Optional[str],
+              filters: Dict[str, set]) -> Dict[str, List[List[float]]]:
+        """Series name -> [[bucket_ms, tokens, cost, calls], ...] in time order."""
+        dim_index = {name: i for i, name in enumerate(TIMESERIES_DIMENSIONS)}
+        result: Dict[str, Dict[int, List[float]]] = {}
+        with self._lock:
+            for bucket, series in self._buckets[resolution].items():
+                if bucket < start_ms or bucket > end_ms:
+                    continue
+                for dims, (tokens, cost, calls) in series.items():
+                    if any(dims[dim_index[name]] not in values for name, values in filters.items()):
+                        continue
+                    name = dims[dim_index[group_by]] if group_by else 'total'
+                    point = result.setdefault(name, {}).setdefault(bucket, [bucket, 0, 0.0, 0])
+                    point[1] += tokens
+                    point[2] += cost
+                    point[3] += calls
+        return {name: [points[b] for b in sorted(points)] for name, points in result.items()}
+
+timeseries_rollup = TimeseriesRollup()
+
+# Aging policy. Sessions idle for longer than ARCHIVE_AFTER are collapsed to
+# frozen records holding only their published stats (the totals and file
+# fingerprints stay in the on-disk index) and their directories are only
+# re-stat'ed by a slow periodic sweep. Parsed message records of the other
+# sessions are kept under an LRU memory budget; evicting them only costs a
+# reparse on an in-place edit or a detail view.
+ARCHIVE_AFTER = timedelta(days=float(os.environ.get('DASHBOARD_ARCHIVE_DAYS', '7')))
+ARCHIVE_SWEEP_INTERVAL = float(os.environ.get('DASHBOARD_ARCHIVE_SWEEP_INTERVAL', '300'))
+CACHE_BUDGET_MB = float(os.environ.get('DASHBOARD_CACHE_BUDGET_MB', '256'))
+# Rough in-memory size of one MessageRecord with its preview and tuples
+RECORD_SIZE_ESTIMATE = 512
+
+_record_lru: 'collections.OrderedDict[str, int]' = collections.OrderedDict() # path -> cached records
+_record_lru_total = 0
+_last_archive_sweep = 0.0
+_last_idle_check = 0.0
+
+def is_archived(stats: Optional[Dict[str, Any]], now: Optional[datetime] = None) -> bool:
+    if stats is None:
+        return False
+    return (now or datetime.now()) - datetime.fromtimestamp(stats['last_activity_ms'] / 1000) > ARCHIVE_AFTER
+
+def freeze_entry(session_path: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Collapse an archived cache entry; call with the cache lock held."""
+    _forget_records(session_path)
+    timeseries_rollup.release(session_path)
+    if session_store is None:
+        # Nowhere to reload the totals from, so only the records go
+        entry['records'] = None
+        entry['frozen'] = True
+        return entry
+    return {'frozen': True, 'dir_mtime': entry['dir_mtime'], 'stats': entry['stats'], 'timeline_applied': True}
+
+def thawed_entry(session_path: str, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Full copy of a frozen entry, from the index unless it kept its totals.
+
+    Leaves the cache alone; once the result is installed, adopt_timeline
+    hands the rollup snapshot released on freezing back.
+    """
+    if 'totals' in entry:
+        return {k: v for k, v in entry.items() if k != 'frozen'}
+    loaded = session_store.load(session_path) if session_store is not None else None
+    if loaded is not None:
+        loaded['timeline_applied'] = True
+    return loaded
+
+def adopt_timeline(session_path: str, entry: Dict[str, Any]) -> None:
+    project = entry['stats']['project_path'] if entry['stats'] else "Unknown"
+    timeseries_rollup.adopt(session_path, entry['totals'].timeline, project)
+
+def drop_session_entry(session_path: str) -> None:
+    """Forget a session whose directory is gone; call with the cache lock held."""
+    entry = _session_cache.pop(session_path, None)
+    if entry is not None and entry.get('frozen'):
+        full = thawed_entry(session_path, entry)
+        if full is not None:
+            adopt_timeline(session_path, full)
+    _forget_records(session_path)
+    timeseries_rollup.remove(session_path)
+
+def _forget_records(session_path: str) -> None:
+    global _record_lru_total
+    _record_lru_total -= _record_lru.pop(session_path, 0)
+
+def _touch_records(session_path: str, entry: Dict[str, Any]) -> None:
+    """Mark a session's records as recently used and enforce the budget; cache lock held."""
+    global _record_lru_total
+    _forget_records(session_path)
+    if entry.get('records') is None:
+        return
+    _record_lru[session_path] = len(entry['records'])
+    _record_lru_total += _record_lru[session_path]
+    budget = CACHE_BUDGET_MB * 1024 * 1024 / RECORD_SIZE_ESTIMATE
+    if _record_lru_total <= budget:
+        return
+    now = datetime.now()
+    for path in list(_record_lru):
+        if _record_lru_total <= budget:
+            break
+        victim = _session_cache.get(path)
+        if victim is not None and victim['stats'] is not None and path != session_path and \
+                now - datetime.fromtimestamp(victim['stats']['last_activity_ms'] / 1000) < ACTIVE_WINDOW:
+            continue # running sessions keep their records
+        if victim is not None and path != session_path:
+            victim['records'] = None
+            _forget_records(path)
+            metrics.inc('ocmonitor_records_evicted_total')
+
+def load_session_base(session_path: str, force: bool = False, check_archived: bool = True,
+                      check_idle: bool = True) -> Optional[Dict[str, Any]]:
+    """Return cached stats for a session without the activity-relative fields.
+
+    The per-file fingerprints of a non-archived session are checked, except
+    that without `check_idle` a session idle past the active window is
+    trusted on a matching directory mtime (new messages still move it).
+    A frozen (archived) one is only rescanned when its directory mtime moved
+    or with `force`, which is what the watcher wants after an event; without
+    `check_archived` it is served without touching its directory at all.
+    """
+    if not force and not check_archived:
+        with _session_cache_lock:
+            entry = _session_cache.get(session_path)
+            if entry is not None and entry.get('frozen'):
+                metrics.inc('ocmonitor_session_cache_total', result='frozen')
+                return entry['stats']
+
+    try:
+        dir_mtime: Optional[int] = os.stat(session_path).st_mtime_ns
+    except OSError:
+        dir_mtime = None
+
+    while True:
+        with _session_cache_lock:
+            if dir_mtime is None:
+                drop_session_entry(session_path)
+                return None
+            cached = _session_cache.get(session_path)
+            if cached is not None and not force and cached['dir_mtime'] == dir_mtime:
+                if cached.get('frozen'):
+                    metrics.inc('ocmonitor_session_cache_total', result='frozen')
+                    return cached['stats']
+                if not check_idle and cached['stats'] is not None and not is_recent_activity(cached['stats']):
+                    metrics.inc('ocmonitor_session_cache_total', result='hit')
+                    return cached['stats']
+
+        # The scan, index reads and parsing run outside the cache lock, against
+        # the entry looked up above. A message file rewritten in place (an
+        # assistant reply finishing) leaves the directory mtime alone, so the
+        # per-file fingerprints of every non-archived session are compared.
+        files = _scan_session_files(session_path)
+        source = 'hit'
+        entry = cached
+        thawed = None
+        if files is not None:
+            if cached is not None and cached.get('frozen'):
+                entry = thawed = thawed_entry(session_path, cached)
+                source = 'thaw'
+            elif cached is None and session_store is not None:
+                entry = session_store.load(session_path)
+                source = 'index'
+            if entry is None:
+                source = 'miss'
+        previous = entry['stats'] if entry is not None else None
+        refreshed = refresh_session_entry(session_path, entry, dir_mtime, files) if files is not None else None
+
+        with _session_cache_lock:
+            if _session_cache.get(session_path) is not cached:
+                continue # another thread installed an entry meanwhile; redo against it
+            if refreshed is None:
+                drop_session_entry(session_path)
+                return None
+            entry = refreshed
+            entry['dir_mtime'] = dir_mtime
+            if thawed is not None:
+                adopt_timeline(session_path, thawed)
+            # Only the fields the index row is built from; they are replaced,
+            # never mutated, so the row can be serialized after the lock is released
+            changed = {'dir_mtime': dir_mtime, 'files': entry['files'], 'totals': entry['totals']} \
+                if source == 'miss' or entry['stats'] is not previous else None
+            if source == 'hit' and changed is not None:
+                source = 'refresh'
+            metrics.inc('ocmonitor_session_cache_total', result=source)
+            if not entry.get('timeline_applied'):
+                project = entry['stats']['project_path'] if entry['stats'] else "Unknown"
+                timeseries_rollup.apply(session_path, entry['totals'].timeline, project)
+                entry['timeline_applied'] = True
+            if is_archived(entry['stats']):
+                entry = freeze_entry(session_path, entry)
+            else:
+                _touch_records(session_path, entry)
+            _session_cache[session_path] = entry
+            stats = entry['stats']
+        if changed is not None and session_store is not None:
+            session_store.save(session_path, changed)
+        return stats
+
+def get_session_stats(session_path: str) -> Optional[Dict[str, Any]]:
+    base = load_session_base(session_path)
+    if base is None:
+        return None
+    return apply_activity_fields(base)
+
+def prune_session_cache(live_paths: List[str]) -> None:
+    """Drop cache entries for session directories that no longer exist."""
+    live = set(live_paths)
+    with _session_cache_lock:
+        for path in [p for p in _session_cache if p not in live]:
+            drop_session_entry(path)
+    if session_store is not None:
+        session_store.prune(live)
+
+# Persistent index of per-session aggregates and file fingerprints, so a
+# restart validates fingerprints instead of reparsing all of DATA_DIR.
+# Set DASHBOARD_INDEX_DB to an empty string to disable it.
+INDEX_DB = os.path.expanduser(os.environ.get('DASHBOARD_INDEX_DB', '~/.cache/opencode-monitor/session-index.sqlite3'))
+INDEX_FLUSH_INTERVAL = 2.0
+# Bump when the shape of the running totals changes; older rows are ignored
+INDEX_SCHEMA = 4
+
+# Running-totals fields holding (order_key, value) pairs, which JSON turns into lists
+_ORDERED_TOTALS_FIELDS = ('first',) + SessionAccumulator.LATEST_FIELDS
+# ...of which these hold a MessageRecord, stored as its slot values
+_RECORD_TOTALS_FIELDS = ('first', 'last')
+
+class SessionStore:
+    """SQLite-backed index of session cache entries, written behind."""
+
+    def __init__(self, db_path: str) -> None:
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " path TEXT PRIMARY KEY,"
+            " schema INTEGER NOT NULL,"
+            " dir_mtime INTEGER NOT NULL,"
+            " files TEXT NOT NULL,"
+            " totals TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        self._paths = {row[0] for row in self._conn.execute("SELECT path FROM sessions")}
+        self._pending: Dict[str, Optional[Tuple[int, str, str]]] = {} # path -> row, or None to delete
+        threading.Thread(target=self._flush_loop, name='session-store', daemon=True).start()
+        atexit.register(self.flush)
+
+    def contains(self, session_path: str) -> bool:
+        return session_path in self._paths
+
+    def load(self, session_path: str) -> Optional[Dict[str, Any]]:
+        """Rebuild a cache entry from the index; it has no per-file records."""
+        if session_path not in self._paths:
+            return None
+        with self._lock:
+            # Unflushed rows win: frozen entries are thawed from here too
+            row = self._pending.get(session_path) or self._conn.execute(
+                "SELECT dir_mtime, files, totals FROM sessions WHERE path = ? AND schema = ?",
+                (session_path, INDEX_SCHEMA)
+            ).fetchone()
+        if row is None:
+            return None
+        data = json.loads(row[2])
+        for field in _ORDERED_TOTALS_FIELDS:
+            if data[field] is not None:
+                key, value = data[field]
+                if field in _RECORD_TOTALS_FIELDS:
+                    value = MessageRecord.from_row(value)
+                data[field] = (tuple(key), value)
+        totals = SessionAccumulator.from_dict(data)
+        return {
+            'dir_mtime': row[0],
+            'files': {name: tuple(fp) for name, fp in json.loads(row[1]).items()},
+            'records': None,
+            'totals': totals,
+            'stats': build_session_stats(os.path.basename(session_path), totals)
+        }
+
+    def save(self, session_path: str, entry: Dict[str, Any]) -> None:
+        row = (entry['dir_mtime'], json.dumps(entry['files']), json.dumps(entry['totals'].to_dict(), default=MessageRecord.to_row))
+        with self._lock:
+            self._pending[session_path] = row
+            self._paths.add(session_path)
+
+    def prune(self, live: set) -> None:
+        with self._lock:
+            for path in [p for p in self._paths if p not in live]:
+                self._pending[path] = None
+                self._paths.discard(path)
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO sessions (path, schema, dir_mtime, files, totals) VALUES (?, ?, ?, ?, ?)",
+                    [(path, INDEX_SCHEMA) + row for path, row in pending.items() if row is not None]
+                )
+                self._conn.executemany(
+                    "DELETE FROM sessions WHERE path = ?",
+                    [(path,) for path, row in pending.items() if row is None]
+                )
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(INDEX_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                app.logger.warning("Session index flush failed: %s", e)
+
+def open_session_store() -> Optional[SessionStore]:
+    if not INDEX_DB:
+        return None
+    try:
+        return SessionStore(INDEX_DB)
+    except (OSError, sqlite3.Error) as e:
+        app.logger.warning("Session index disabled (%s): %s", INDEX_DB, e)
+        return None
+
+# Worker processes re-import this module under spawn; only the parent owns the index
+session_store = open_session_store() if multiprocessing.parent_process() is None else None
+
+# Full rescans (cold start with an empty index, or a new DATA_DIR) parse the
+# uncached sessions in worker processes, since JSON decoding is CPU bound and
+# a thread pool would serialize on the GIL. Workers are started through a
+# forkserver (spawn where that is missing) rather than forked: by the time
+# of a rescan the server, remote-fetch and flusher threads are running, and
+# a child forked while one of them holds a lock would deadlock on it.
+# Set DASHBOARD_PARSE_WORKERS to 1 to always parse in-process.
+PARSE_WORKERS = int(os.environ.get('DASHBOARD_PARSE_WORKERS') or os.cpu_count() or 1)
+PARSE_PARALLEL_MIN = int(os.environ.get('DASHBOARD_PARSE_PARALLEL_MIN', '200'))
+PARSE_CHUNKSIZE = 16
+PARSE_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+def parse_session_dir(session_path: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Build a fresh cache entry for one session; runs in a worker process."""
+    try:
+        dir_mtime = os.stat(session_path).st_mtime_ns
+    except OSError:
+        return None
+    files = _scan_session_files(session_path)
+    if files is None:
+        return None
+    records = {}
+    totals = SessionAccumulator()
+    for name in files:
+        record = load_message(os.path.join(session_path, name), count=False)
+        if record is not None:
+            records[name] = record
+            totals.add(name, record)
+    return session_path, {
+        'dir_mtime': dir_mtime,
+        'files': files,
+        'records': records,
+        'totals': totals,
+        'stats': build_session_stats(os.path.basename(session_path), totals),
+        'timeline_applied': False
+    }
+
+def preload_sessions(session_paths: List[str]) -> int:
+    """Parse uncached sessions across processes when there are enough of them.
+
+    Returns the number of entries added; smaller batches are left to the
+    regular per-session path in load_session_base.
+    """
+    with _session_cache_lock:
+        missing = [
+            p for p in session_paths
+            if p not in _session_cache and (session_store is None or not session_store.contains(p))
+        ]
+    workers = min(PARSE_WORKERS, len(missing) // PARSE_CHUNKSIZE + 1)
+    if len(missing) < PARSE_PARALLEL_MIN or workers <= 1:
+        return 0
+    added = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(PARSE_START_METHOD)) as pool:
+            for result in pool.map(parse_session_dir, missing, chunksize=PARSE_CHUNKSIZE):
+                if result is None:
+                    continue
+                path, entry = result
+                with _session_cache_lock:
+                    if path in _session_cache:
+                        continue
+                    _session_cache[path] = entry
+                if session_store is not None:
+                    session_store.save(path, entry)
+                # Workers leave the metrics alone; account for them here
+                metrics.inc('ocmonitor_files_parsed_total', len(entry['files']))
+                metrics.inc('ocmonitor_bytes_parsed_total', sum(size for _, size in entry['files'].values()))
+                added += 1
+    except (OSError, RuntimeError) as e:
+        # e.g. no process/semaphore support in a sandbox; fall back to serial parsing
+        app.logger.warning("Parallel session parse failed, parsing serially: %s", e)
+    return added
+
+# Optional watcher mode: keep the local session index up to date from
+# filesystem events instead of rescanning DATA_DIR on every request.
+WATCH_ENABLED = os.environ.get('DASHBOARD_WATCH', '').lower() in ('1', 'true', 'yes', 'on')
+WATCH_DEBOUNCE = float(os.environ.get('DASHBOARD_WATCH_DEBOUNCE', '1.0'))
+# Without inotify, sessions active within ACTIVE_WINDOW are tail-followed every
+# WATCH_ACTIVE_INTERVAL: their directory mtime catches new message files and
+# the newest WATCH_TAIL_FILES files are stat'ed for in-place rewrites. The
+# full tree is only swept every WATCH_POLL_INTERVAL.
+WATCH_POLL_INTERVAL = float(os.environ.get('DASHBOARD_WATCH_POLL_INTERVAL', '10.0'))
+WATCH_ACTIVE_INTERVAL = float(os.environ.get('DASHBOARD_WATCH_ACTIVE_INTERVAL', '0.5'))
+WATCH_TAIL_FILES = 3
+
+class Inotify:
+    """Minimal ctypes binding for Linux inotify (no third-party dependency)."""
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+
+    ROOT_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+    SESSION_MASK = IN_CLOSE_WRITE | IN_MODIFY | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF
+
+    _EVENT = struct.Struct('iIII')
+
+    def __init__(self) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._libc = libc
+        self.fd = fd
+        self.paths: Dict[int, str] = {}
+
+    def add_watch(self, path: str, mask: int) -> None:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        self.paths[wd] = path
+
+    def read_events(self, timeout: float) -> List[Tuple[str, int, str]]:
+        """Return (watched path, mask, name) tuples, waiting up to `timeout`."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + self._EVENT.size <= len(buf):
+            wd, mask, _cookie, length = self._EVENT.unpack_from(buf, offset)
+            offset += self._EVENT.size
+            name = buf[offset:offset + length].rstrip(b'\0').decode('utf-8', 'replace')
+            offset += length
+            if mask & self.IN_IGNORED:
+                self.paths.pop(wd, None)
+                continue
+            events.append((self.paths.get(wd, ''), mask, name))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+class SessionWatcher:
+    """In-memory index of local sessions, updated as filesystem events arrive.
+
+    Events are coalesced per session: the first event schedules a refresh one
+    debounce window later and further events in that window ride along, so a
+    busy session is reparsed at most once per window.
+    """
+
+    def __init__(self, data_dir: str, debounce: float = WATCH_DEBOUNCE, poll_interval: float = WATCH_POLL_INTERVAL,
+                 active_interval: float = WATCH_ACTIVE_INTERVAL) -> None:
+        self.data_dir = data_dir
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.active_interval = active_interval
+        self.backend = 'polling'
+        self.index: Dict[str, Dict[str, Any]] = {} # session path -> cached base stats
+        self.ready = threading.Event()
+        self._cond = threading.Condition()
+        self._pending: Dict[str, float] = {} # session path -> refresh deadline
+        self._dir_mtimes: Dict[str, int] = {}
+        self._last_archive_sweep = 0.0
+        # Active session path -> (dir mtime, {tail file name: (mtime_ns, size)})
+        self._tails: Dict[str, Tuple[Optional[int], Dict[str, Tuple[int, int]]]] = {}
+        self._inotify: Optional[Inotify] = None
+
+    def start(self) -> None:
+        threading.Thread(target=self._run, name='session-watcher', daemon=True).start()
+        threading.Thread(target=self._flush_loop, name='session-watcher-flush', daemon=True).start()
+
+    def sessions(self) -> List[Dict[str, Any]]:
+        """Serialize the current index with activity fields for now."""
+        self.ready.wait()
+        now = datetime.now()
+        with self._cond:
+            bases = list(self.index.values())
+        return [apply_activity_fields(base, now) for base in bases]
+
+    def mark_dirty(self, session_path: str) -> None:
+        with self._cond:
+            if session_path not in self._pending:
+                self._pending[session_path] = time.monotonic() + self.debounce
+                self._cond.notify()
+
+    def _list_session_paths(self) -> List[str]:
+        try:
+            return [os.path.join(self.data_dir, d) for d in os.listdir(self.data_dir) if d.startswith('ses_')]
+        except OSError:
+            return []
+
+    def _refresh(self, session_path: str, force: bool = True) -> None:
+        base = load_session_base(session_path, force=force)
+        with self._cond:
+            if base is None:
+                previous = self.index.pop(session_path, None)
+            else:
+                previous = self.index.get(session_path)
+                self.index[session_path] = base
+            if base is not None and is_recent_activity(base):
+                self._tails.setdefault(session_path, (None, {}))
+            else:
+                self._tails.pop(session_path, None)
+        if base is not previous and self.ready.is_set():
+            # Publish the change now rather than on the next ingest tick
+            ingest_scheduler.poke()
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                due = [p for p, deadline in self._pending.items() if deadline <= now]
+                if not due:
+                    wait = min(self._pending.values()) - now if self._pending else None
+                    self._cond.wait(wait)
+                    continue
+                for path in due:
+                    del self._pending[path]
+            for path in due:
+                self._refresh(path)
+
+    def _start_inotify(self, session_paths: List[str]) -> bool:
+        if not sys.platform.startswith('linux'):
+            return False
+        inotify = None
+        try:
+            inotify = Inotify()
+            inotify.add_watch(self.data_dir, Inotify.ROOT_MASK)
+            for path in session_paths:
+                inotify.add_watch(path, Inotify.SESSION_MASK)
+        except (OSError, AttributeError) as e:
+            # Typically the fs.inotify.max_user_watches limit on large histories
+            app.logger.warning("inotify unavailable (%s), falling back to polling", e)
+            if inotify is not None:
+                inotify.close()
+            return False
+        self._inotify = inotify
+        self.backend = 'inotify'
+        return True
+
+    def _run(self) -> None:
+        session_paths = self._list_session_paths()
+        # Watches go in before the initial scan so no write falls in between
+        use_inotify = self._start_inotify(session_paths)
+        preload_sessions(session_paths)
+        for path in session_paths:
+            try:
+                self._dir_mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                pass
+            self._refresh(path, force=False)
+        self.ready.set()
+        if use_inotify:
+            self._inotify_loop()
+        else:
+            self._poll_loop()
+
+    def _inotify_loop(self) -> None:
+        inotify = self._inotify
+        assert inotify is not None
+        while True:
+            for watched, mask, name in inotify.read_events(timeout=1.0):
+                if mask & Inotify.IN_Q_OVERFLOW:
+                    for path in self._list_session_paths() + list(self.index):
+                        self.mark_dirty(path)
+                elif watched == self.data_dir:
+                    if not name.startswith('ses_'):
+                        continue
+                    path = os.path.join(self.data_dir, name)
+                    if mask & (Inotify.IN_CREATE | Inotify.IN_MOVED_TO) and mask & Inotify.IN_ISDIR:
+                        try:
+                            inotify.add_watch(path, Inotify.SESSION_MASK)
+                        except OSError as e:
+                            app.logger.warning("Cannot watch %s: %s", path, e)
+                    self.mark_dirty(path)
+                elif watched and (name.endswith('.json') or mask & Inotify.IN_DELETE_SELF):
+                    self.mark_dirty(watched)
+
+    def _poll_loop(self) -> None:
+        next_sweep = time.monotonic() + self.poll_interval
+        root_mtime = self._root_mtime()
+        while True:
+            time.sleep(self.active_interval)
+            mtime = self._root_mtime()
+            if time.monotonic() >= next_sweep or mtime != root_mtime:
+                # A new or removed session directory changes the root mtime
+                root_mtime = mtime
+                self._sweep(full=time.monotonic() >= next_sweep)
+                if time.monotonic() >= next_sweep:
+                    next_sweep = time.monotonic() + self.poll_interval
+            self._follow_active()
+
+    def _root_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.data_dir).st_mtime_ns
+        except OSError:
+            return None
+
+    def _sweep(self, full: bool) -> None:
+        # Archived sessions are only re-stat'ed every ARCHIVE_SWEEP_INTERVAL
+        archive_sweep = full and time.monotonic() - self._last_archive_sweep >= ARCHIVE_SWEEP_INTERVAL
+        if archive_sweep:
+            self._last_archive_sweep = time.monotonic()
+        with self._cond:
+            known = dict(self.index)
+        now = datetime.now()
+        seen = set()
+        changed = set()
+        for path in self._list_session_paths():
+            seen.add(path)
+            if path in self._dir_mtimes and (
+                    not full or not archive_sweep and path in known and is_archived(known[path], now)):
+                continue
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            if self._dir_mtimes.get(path) != mtime:
+                self._dir_mtimes[path] = mtime
+                self.mark_dirty(path)
+                changed.add(path)
+        for path, base in known.items():
+            if path not in seen:
+                self._dir_mtimes.pop(path, None)
+                self.mark_dirty(path)
+            elif full and path not in changed and not is_archived(base, now):
+                # Any message file may be rewritten in place without touching
+                # the directory mtime; the tail check covers the newest files
+                # of active sessions between sweeps
+                self._refresh(path, force=False)
+
+    def _follow_active(self) -> None:
+        """Refresh active sessions whose directory or newest files changed."""
+        now = datetime.now()
+        with self._cond:
+            for path in list(self._tails):
+                base = self.index.get(path)
+                if base is None or not is_recent_activity(base, now):
+                    del self._tails[path]
+            tails = list(self._tails.items())
+        for path, (dir_mtime, tail) in tails:
+            try:
+                mtime = os.stat(path).st_mtime_ns
+                changed = mtime != dir_mtime
+                for name, fingerprint in tail.items():
+                    if changed:
+                        break
+                    st = os.stat(os.path.join(path, name))
+                    changed = (st.st_mtime_ns, st.st_size) != fingerprint
+            except OSError:
+                changed, mtime = True, None
+            if not changed:
+                continue
+            if dir_mtime is not None:
+                metrics.inc('ocmonitor_tail_refresh_total')
+            self._dir_mtimes[path] = mtime if mtime is not None else 0
+            self._refresh(path)
+            with self._cond:
+                if path in self._tails and mtime is not None:
+                    self._tails[path] = (mtime, self._scan_tail(path))
+
+    def _scan_tail(self, session_path: str) -> Dict[str, Tuple[int, int]]:
+        """Fingerprints of the newest message files; ids sort by creation."""
+        try:
+            with os.scandir(session_path) as entries:
+                names = heapq.nlargest(WATCH_TAIL_FILES, (e.name for e in entries if e.name.endswith('.json')))
+        except OSError:
+            return {}
+        tail = {}
+        for name in names:
+            try:
+                st = os.stat(os.path.join(session_path, name))
+            except OSError:
+                continue
+            tail[name] = (st.st_mtime_ns, st.st_size)
+        return tail
+
+_session_watcher: Optional[SessionWatcher] = None
+_session_watcher_lock = threading.Lock()
+
+def get_session_watcher() -> Optional[SessionWatcher]:
+    """Start the watcher on first use when watcher mode is enabled."""
+    global _session_watcher
+    if not WATCH_ENABLED:
+        return None
+    with _session_watcher_lock:
+        if _session_watcher is None:
+            _session_watcher = SessionWatcher(DATA_DIR)
+            _session_watcher.start()
+        return _session_watcher
+
+def iter_local_sessions() -> List[Dict[str, Any]]:
+    """Stats for every local session, from the watcher index or a scan."""
+    watcher = get_session_watcher()
+    if watcher is not None:
+        return watcher.sessions()
+
+    with timed('listdir'):
+        session_paths = [os.path.join(DATA_DIR, d) for d in os.listdir(DATA_DIR) if d.startswith('ses_')]
+    prune_session_cache(session_paths)
+    preload_sessions(session_paths)
+    # Archived sessions are only re-stat'ed by the periodic sweep, and the
+    # files of idle ones are only fingerprinted on the idle ingest cadence
+    global _last_archive_sweep, _last_idle_check
+    sweep = time.monotonic() - _last_archive_sweep >= ARCHIVE_SWEEP_INTERVAL
+    if sweep:
+        _last_archive_sweep = time.monotonic()
+    check_idle = time.monotonic() - _last_idle_check >= INGEST_IDLE_INTERVAL
+    if check_idle:
+        _last_idle_check = time.monotonic()
+    now = datetime.now()
+    local_sessions = []
+    for path in session_paths:
+        base = load_session_base(path, check_archived=sweep, check_idle=check_idle)
+        if base is not None:
+            local_sessions.append(apply_activity_fields(base, now))
+    return local_sessions
+
+def load_config() -> Dict[str, Any]:
+    if not os.path.exists(CONFIG_FILE):
+        return {"devices": []}
+    try:
+        with open(CONFIG_FILE, 'r') as f:
+            return json.load(f)
+    except Exception:
+        return {"devices": []}
+
+# Compact wire format. Opt in with `Accept: application/vnd.ocmonitor.columnar+json`
+# (or application/msgpack when msgpack is installed, or ?format=columnar|msgpack).
+# Sessions are sent as one array per field, display strings are dropped in
+# favour of the numbers they are formatted from, and per-session agent/model
+# stats become fixed-order counter arrays. expand_sessions() reverses it.
+COMPACT_MIMETYPE = 'application/vnd.ocmonitor.columnar+json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+STATS_FIELDS = ('calls', 'success', 'failed', 'tool_calls', 'length', 'other', 'tokens', 'cost')
+COMPRESS_MIN_SIZE = 1024
+
+# Derived field -> the field it is rebuilt from; dropped when that is present
+COMPACT_DERIVED_FIELDS = {
+    'cost': 'cost_val',
+    'started': 'timestamp',
+    'last_activity': 'last_activity_ms',
+    'duration': 'last_activity_ms',
+    'duration_formatted': 'last_activity_ms',
+    'time_since_activity': 'last_activity_ms',
+    'seconds_since_activity': 'last_activity_ms',
+    'context_size': 'current_turn_context',
+    'total_tokens': 'input_tokens',
+    'has_latency': 'avg_latency',
+    'has_cache_data': 'cache_read_tokens',
+    'has_reasoning': 'reasoning_tokens',
+    'has_file_changes': 'files_changed'
+}
+
+def _to_number(value: Any) -> Any:
+    try:
+        return float(str(value).lstrip('$').rstrip('s'))
+    except ValueError:
+        return value
+
+def _encode_stats(stats: Any) -> Any:
+    if not isinstance(stats, dict):
+        return stats
+    return {name: [entry.get(f, 0) for f in STATS_FIELDS] for name, entry in stats.items() if isinstance(entry, dict)}
+
+def _decode_stats(stats: Any) -> Any:
+    if not isinstance(stats, dict):
+        return stats
+    return {name: dict(zip(STATS_FIELDS, row)) if isinstance(row, list) else row for name, row in stats.items()}
+
+def _encode_models_used(models: Any) -> Any:
+    if not isinstance(models, list):
+        return models
+    return [[m.get('name'), m.get('tokens', 0), _to_number(m.get('cost', 0))] for m in models if isinstance(m, dict)]
+
+def _decode_models_used(models: Any) -> Any:
+    if not isinstance(models, list):
+        return models
+    return [
+        {'name': m[0], 'tokens': m[1], 'cost': f"${m[2]:.2f}" if isinstance(m[2], (int, float)) else m[2]}
+        if isinstance(m, list) else m
+        for m in models
+    ]
+
+def _format_number(template: str) -> Any:
+    return lambda value: template.format(value) if isinstance(value, (int, float)) else value
+
+COMPACT_ENCODERS = {
+    'avg_latency': _to_number,
+    'cache_savings': _to_number,
+    'latest_duration': _to_number,
+    'models_used': _encode_models_used,
+    'agent_stats': _encode_stats,
+    'model_stats': _encode_stats
+}
+
+COMPACT_DECODERS = {
+    'avg_latency': _format_number("{:.1f}"),
+    'cache_savings': _format_number("{:.2f}"),
+    'latest_duration': _format_number("{:.0f}s"),
+    'models_used': _decode_models_used,
+    'agent_stats': _decode_stats,
+    'model_stats': _decode_stats
+}
+
+def compact_sessions(sessions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    keys: Dict[str, None] = {}
+    for session in sessions:
+        keys.update(dict.fromkeys(session))
+    columns = {}
+    for key in keys:
+        source = COMPACT_DERIVED_FIELDS.get(key)
+        encoder = COMPACT_ENCODERS.get(key)
+        column = []
+        for session in sessions:
+            value = session.get(key)
+            if source is not None and session.get(source) is not None:
+                value = None
+            elif encoder is not None and value is not None:
+                value = encoder(value)
+            column.append(value)
+        if source is None or any(v is not None for v in column):
+            columns[key] = column
+    return {'count': len(sessions), 'columns': columns}
+
+def restore_derived_fields(session: Dict[str, Any], now: datetime) -> None:
+    if 'cost' not in session and isinstance(session.get('cost_val'), (int, float)):
+        session['cost'] = f"${session['cost_val']:.4f}"
+    if 'started' not in session and session.get('timestamp') is not None:
+        session['started'] = format_timestamp(session['timestamp'])
+    last_activity_ms = session.get('last_activity_ms')
+    if last_activity_ms is not None:
+        session.setdefault('last_activity', format_timestamp(last_activity_ms))
+        if 'duration' not in session:
+            session['duration'], session['duration_formatted'] = format_duration(last_activity_ms - session.get('timestamp', last_activity_ms))
+        if 'seconds_since_activity' not in session:
+            set_time_since_fields(session, last_activity_ms, now)
+    if 'context_size' not in session and 'current_turn_context' in session:
+        session['context_size'] = session['current_turn_context']
+    if 'total_tokens' not in session and 'input_tokens' in session:
+        session['total_tokens'] = session['input_tokens'] + session.get('output_tokens', 0)
+    for flag, source in (('has_latency', 'avg_latency'), ('has_cache_data', 'cache_read_tokens'),
+                         ('has_reasoning', 'reasoning_tokens'), ('has_file_changes', 'files_changed')):
+        if flag not in session and source in session:
+            session[flag] = _to_number(session[source]) > 0
+
+def expand_sessions(compact: Dict[str, Any]) -> List[Dict[str, Any]]:
+    sessions: List[Dict[str, Any]] = [{} for _ in range(compact.get('count', 0))]
+    for key, column in compact.get('columns', {}).items():
+        decoder = COMPACT_DECODERS.get(key)
+        derived = key in COMPACT_DERIVED_FIELDS
+        for session, value in zip(sessions, column):
+            if value is None and derived:
+                continue
+            session[key] = decoder(value) if decoder is not None and value is not None else value
+    now = datetime.now()
+    for session in sessions:
+        restore_derived_fields(session, now)
+    return sessions
+
+def encode_compact_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    body = dict(payload)
+    for key in ('sessions', 'added', 'changed'):
+        if isinstance(body.get(key), list):
+            body[key] = compact_sessions(body[key])
+    body['encoding'] = 'columnar'
+    return body
+
+def decode_compact_payload(body: Dict[str, Any]) -> Dict[str, Any]:
+    if body.get('encoding') != 'columnar':
+        return body
+    payload = dict(body)
+    del payload['encoding']
+    for key in ('sessions', 'added', 'changed'):
+        if isinstance(payload.get(key), dict):
+            payload[key] = expand_sessions(payload[key])
+    return payload
+
+def negotiated_encoding() -> Optional[str]:
+    """'msgpack', 'columnar' or None (plain JSON) for the current request."""
+    fmt = request.args.get('format')
+    accepted = {mimetype for mimetype, quality in request.accept_mimetypes if quality > 0}
+    if msgpack is not None and (fmt == 'msgpack' or MSGPACK_MIMETYPE in accepted):
+        return 'msgpack'
+    if fmt in ('columnar', 'msgpack') or COMPACT_MIMETYPE in accepted:
+        return 'columnar'
+    return None
+
+def payload_response(payload: Dict[str, Any]) -> Response:
+    encoding = negotiated_encoding()
+    with timed('serialize'):
+        if encoding is None:
+            response = jsonify(payload)
+        elif encoding == 'msgpack' and msgpack is not None:
+            response = Response(msgpack.packb(encode_compact_payload(payload), use_bin_type=True), mimetype=MSGPACK_MIMETYPE)
+        else:
+            response = Response(json.dumps(encode_compact_payload(payload), separators=(',', ':'), ensure_ascii=False),
+                                mimetype=COMPACT_MIMETYPE)
+    response.vary.add('Accept')
+    return response
+
+@app.before_request
+def start_request_timer() -> None:
+    g.request_started = time.perf_counter()
+
+# Registered before compress_response so it runs after it and sees its timing
+@app.after_request
+def record_request_timing(response: Response) -> Response:
+    started = g.get('request_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    metrics.observe('ocmonitor_request_seconds', elapsed, endpoint=request.endpoint or 'unknown')
+    if SERVER_TIMING:
+        timings = g.get('server_timing', {})
+        response.headers['Server-Timing'] = ', '.join(
+            [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items()]
+            + [f"total;dur={elapsed * 1000:.2f}"]
+        )
+    return response
+
+@app.after_request
+def compress_response(response: Response) -> Response:
+    """gzip (or brotli when installed) for sizeable buffered responses."""
+    if (response.is_streamed or response.direct_passthrough or response.status_code != 200
+            or 'Content-Encoding' in response.headers):
+        return response
+    accept_encoding = request.headers.get('Accept-Encoding', '')
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    if brotli is not None and 'br' in accept_encoding:
+        with timed('compress'):
+            response.set_data(brotli.compress(data, quality=4))
+        response.headers['Content-Encoding'] = 'br'
+    elif 'gzip' in accept_encoding:
+        with timed('compress'):
+            response.set_data(gzip.compress(data, compresslevel=5))
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        return response
+    response.vary.add('Accept-Encoding')
+    # The body now differs per encoding, so the version tag is only weak
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+# Remote devices are fetched concurrently over one pooled keep-alive session
+REMOTE_TIMEOUT = float(os.environ.get('DASHBOARD_REMOTE_TIMEOUT', '3'))
+REMOTE_DEADLINE = float(os.environ.get('DASHBOARD_REMOTE_DEADLINE', '4'))
+REMOTE_WORKERS = int(os.environ.get('DASHBOARD_REMOTE_WORKERS', '16'))
+
+http_session = requests.Session()
+http_session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=REMOTE_WORKERS, pool_maxsize=REMOTE_WORKERS))
+http_session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=REMOTE_WORKERS, pool_maxsize=REMOTE_WORKERS))
+remote_pool = ThreadPoolExecutor(max_workers=REMOTE_WORKERS, thread_name_prefix='remote-fetch')
+
+def fetch_device(device: Dict[str, Any], previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Fetch one remote device, reporting latency and the failure reason.
+
+    With the previously mirrored payload the request is conditional and asks
+    for a delta, so unchanged or mostly unchanged agents transfer little.
+    """
+    device_url = device.get('url', '')
+    started = time.monotonic()
+    # Aggregators need the per-session agent/model stats for their metrics
+    params = {'view': 'full'}
+    headers = {}
+    if previous is not None and previous.get('epoch') is not None:
+        params.update({'since': previous['version'], 'epoch': previous['epoch']})
+        headers['If-None-Match'] = f'"{previous["epoch"]}-{previous["version"]}"'
+    headers['Accept'] = f"{COMPACT_MIMETYPE}, application/json;q=0.5"
+    if msgpack is not None:
+        headers['Accept'] = f"{MSGPACK_MIMETYPE}, {headers['Accept']}"
+    data = None
+    error = None
+    try:
+        response = http_session.get(f"{device_url}/api/sessions", params=params, headers=headers,
+                                    timeout=float(device.get('timeout', REMOTE_TIMEOUT)))
+        if response.status_code == 304 and previous is not None:
+            data = previous
+        elif response.status_code == 200:
+            if msgpack is not None and response.headers.get('Content-Type', '').startswith(MSGPACK_MIMETYPE):
+                data = decode_compact_payload(msgpack.unpackb(response.content, raw=False))
+            else:
+                data = decode_compact_payload(response.json())
+            if data.get('delta') and previous is not None:
+                data = apply_session_delta(previous, data)
+        else:
+            error = f"HTTP {response.status_code}"
+    except Exception as e:
+        error = type(e).__name__
+    return {
+        'status': 'ok' if data is not None else 'error',
+        'latency_ms': int((time.monotonic() - started) * 1000),
+        'error': error,
+        'data': data
+    }
+
+# Stale-while-revalidate: the last good payload of each remote device is
+# served straight away (with its age) while a background refresh runs, and a
+# circuit breaker with exponential backoff stops hammering unreachable hosts.
+REMOTE_GRACE = float(os.environ.get('DASHBOARD_REMOTE_GRACE', '0.25'))
+REMOTE_MAX_STALE = float(os.environ.get('DASHBOARD_REMOTE_MAX_STALE', '600'))
+CIRCUIT_THRESHOLD = int(os.environ.get('DASHBOARD_CIRCUIT_THRESHOLD', '3'))
+CIRCUIT_BASE_BACKOFF = float(os.environ.get('DASHBOARD_CIRCUIT_BASE_BACKOFF', '5'))
+CIRCUIT_MAX_BACKOFF = float(os.environ.get('DASHBOARD_CIRCUIT_MAX_BACKOFF', '300'))
+
+class RemoteDeviceState:
+    """Cached payload, in-flight refresh and circuit breaker for one device."""
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self._lock = threading.Lock()
+        self._future: Optional[Future] = None
+        self.payload: Optional[Dict[str, Any]] = None
+        self.fetched_at: Optional[float] = None
+        self.failures = 0
+        self.open_until = 0.0
+        self.last_status = 'unknown'
+        self.last_error: Optional[str] = None
+        self.last_latency_ms: Optional[int] = None
+
+    def circuit(self) -> str:
+        if self.failures < CIRCUIT_THRESHOLD:
+            return 'closed'
+        return 'open' if time.monotonic() < self.open_until else 'half-open'
+
+    def cached(self) -> Tuple[Optional[Dict[str, Any]], Optional[float]]:
+        """Last good payload and its age in seconds, if not too stale."""
+        with self._lock:
+            if self.payload is None or self.fetched_at is None:
+                return None, None
+            age = time.time() - self.fetched_at
+            if age > REMOTE_MAX_STALE:
+                return None, age
+            return self.payload, age
+
+    def refresh(self, device: Dict[str, Any]) -> Optional[Future]:
+        """Start a background fetch unless one is in flight or the circuit is open."""
+        with self._lock:
+            if self._future is not None and not self._future.done():
+                return self._future
+            if self.circuit() == 'open':
+                return None
+            self._future = remote_pool.submit(self._fetch, device)
+            return self._future
+
+    def _fetch(self, device: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            previous = self.payload
+        result = fetch_device(device, previous)
+        metrics.observe('ocmonitor_device_fetch_seconds', result['latency_ms'] / 1000, device=self.url)
+        metrics.inc('ocmonitor_device_fetch_total', device=self.url, status=str(result['status']))
+        with self._lock:
+            self.last_status = result['status']
+            self.last_error = result['error']
+            self.last_latency_ms = result['latency_ms']
+            if result['data'] is not None:
+                self.payload = result['data']
+                self.fetched_at = time.time()
+                self.failures = 0
+                self.open_until = 0.0
+            else:
+                self.failures += 1
+                if self.failures >= CIRCUIT_THRESHOLD:
+                    backoff = CIRCUIT_BASE_BACKOFF * (2 ** (self.failures - CIRCUIT_THRESHOLD))
+                    self.open_until = time.monotonic() + min(CIRCUIT_MAX_BACKOFF, backoff)
+        return result
+
+    def health(self) -> Dict[str, Any]:
+        with self._lock:
+            circuit = self.circuit()
+            return {
+                'status': self.last_status,
+                'error': self.last_error,
+                'latency_ms': self.last_latency_ms,
+                'circuit': circuit,
+                'failures': self.failures,
+                'retry_in_s': round(max(0.0, self.open_until - time.monotonic()), 1) if circuit == 'open' else 0,
+                'age_s': round(time.time() - self.fetched_at, 1) if self.fetched_at is not None else None
+            }
+
+_remote_states: Dict[str, RemoteDeviceState] = {}
+_remote_states_lock = threading.Lock()
+
+def remote_device_state(device_url: str) -> RemoteDeviceState:
+    with _remote_states_lock:
+        state = _remote_states.get(device_url)
+        if state is None:
+            state = _remote_states[device_url] = RemoteDeviceState(device_url)
+        return state
+
+@app.route('/')
+def index():
+    return render_template('index.html')
+
+@app.route('/api/devices')
+def get_devices():
+    config = load_config()
+    devices = []
+    for device in config.get("devices", []):
+        device = dict(device)
+        if device.get('url', '') != 'local':
+            device['health'] = remote_device_state(device.get('url', '')).health()
+        devices.append(device)
+    return jsonify({"devices": devices})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    gauges = [
+        ('ocmonitor_sessions_cached', 'Session entries held in the in-memory cache.', len(_session_cache)),
+        ('ocmonitor_sessions_frozen', 'Archived sessions collapsed to frozen stats.', sum(1 for e in list(_session_cache.values()) if e.get('frozen'))),
+        ('ocmonitor_records_cached', 'Parsed message records held under the memory budget.', _record_lru_total),
+        ('ocmonitor_snapshot_age_seconds', 'Age of the published sessions snapshot.', ingest_scheduler.age()),
+    ]
+    lines = [metrics.render()]
+    for name, help_text, value in gauges:
+        if value is not None:
+            lines.append(f"# HELP {name} {help_text}\n# TYPE {name} gauge\n{name} {value}\n")
+    return Response(''.join(lines), mimetype='text/plain; version=0.0.4')
+
+# Fields that tick with wall-clock time; clients derive them from last_activity_ms
+VOLATILE_SESSION_FIELDS = ('time_since_activity', 'seconds_since_activity')
+
+def session_key(session: Dict[str, Any]) -> str:
+    return f"{session.get('device_id', 'local')}:{session.get('id')}"
+
+def session_fingerprint(session: Dict[str, Any]) -> int:
+    return hash(json.dumps({k: v for k, v in session.items() if k not in VOLATILE_SESSION_FIELDS}, default=str))
+
+def session_change_token(session: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Cheap stand-in for the fingerprint: the per-session stats dicts are
+    rebuilt whenever a session's cached stats (or mirrored remote copy)
+    change, so their identity plus the fields set per build mark a change."""
+    return (session.get('agent_stats'), session.get('model_stats'), session.get('status'), session.get('device_name'))
+
+def same_change_token(a: Tuple[Any, ...], b: Tuple[Any, ...]) -> bool:
+    return a[0] is not None and a[0] is b[0] and a[1] is b[1] and a[2:] == b[2:]
+
+# Aggregate tables reused across builds while no session changed
+METRICS_TABLE_FIELDS = ('agent_stats', 'model_stats', 'device_stats')
+
+class SessionVersions:
+    """Monotonic version counter over payload changes, for ETags and deltas.
+
+    Every session remembers the version at which its content last changed and
+    removed sessions leave a tombstone, so `?since=<version>` can be answered
+    with just the sessions changed after that version. The epoch changes on
+    restart so clients never apply a delta against another process's counter.
+    """
+    TOMBSTONE_LIMIT = 10000
+
+    def __init__(self) -> None:
+        self.epoch = uuid.uuid4().hex[:12]
+        self.version = 0
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, Tuple[int, int]] = {} # key -> (fingerprint, version)
+        self._tokens: Dict[str, Tuple[Any, ...]] = {} # key -> session_change_token
+        self._removed: Dict[str, int] = {} # key -> version it was removed at
+        self._metrics_fingerprint: Optional[Tuple[int, int]] = None
+        self._metrics_tables: Tuple[Any, ...] = ()
+        self._floor = 0 # deltas from below this version can no longer be built
+
+    def update(self, payload: Dict[str, Any]) -> None:
+        """Assign versions for a freshly built payload and stamp it."""
+        with self._lock:
+            next_version = self.version + 1
+            changed = False
+            seen = set()
+            for session in payload.get('sessions', []):
+                key = session_key(session)
+                seen.add(key)
+                # Only sessions whose stats objects were replaced get serialized
+                token = session_change_token(session)
+                previous_token = self._tokens.get(key)
+                self._tokens[key] = token
+                if previous_token is not None and same_change_token(token, previous_token):
+                    continue
+                fingerprint = session_fingerprint(session)
+                current = self._sessions.get(key)
+                if current is None or current[0] != fingerprint:
+                    self._sessions[key] = (fingerprint, next_version)
+                    self._removed.pop(key, None)
+                    changed = True
+            for key in [k for k in self._sessions if k not in seen]:
+                del self._sessions[key]
+                self._tokens.pop(key, None)
+                self._removed[key] = next_version
+                changed = True
+
+            metrics = payload.get('metrics') or {}
+            tables = tuple(metrics.get(name) for name in METRICS_TABLE_FIELDS)
+            rest = {k: v for k, v in metrics.items() if k not in METRICS_TABLE_FIELDS}
+            if self._metrics_fingerprint is not None and len(tables) == len(self._metrics_tables) and \
+                    all(a is b for a, b in zip(tables, self._metrics_tables)):
+                # Still the cached aggregate tables: only the small rest is hashed
+                tables_fingerprint = self._metrics_fingerprint[0]
+            else:
+                tables_fingerprint = hash(json.dumps(tables, sort_keys=True, default=str))
+            self._metrics_tables = tables
+            metrics_fingerprint = (tables_fingerprint, hash(json.dumps(rest, sort_keys=True, default=str)))
+            if metrics_fingerprint != self._metrics_fingerprint:
+                self._metrics_fingerprint = metrics_fingerprint
+                changed = True
+
+            if changed:
+                self.version = next_version
+            if len(self._removed) > self.TOMBSTONE_LIMIT:
+                oldest = sorted(self._removed.items(), key=lambda item: item[1])
+                for key, version in oldest[:len(self._removed) - self.TOMBSTONE_LIMIT]:
+                    del self._removed[key]
+                    self._floor = max(self._floor, version)
+
+            payload['version'] = self.version
+            payload['epoch'] = self.epoch
+
+    def etag(self, payload: Dict[str, Any]) -> str:
+        return f"{payload['epoch']}-{payload['version']}"
+
+    def delta_since(self, payload: Dict[str, Any], since: int) -> Optional[Dict[str, Any]]:
+        """Sessions changed after `since`, or None if a full payload is needed."""
+        with self._lock:
+            if since < self._floor or since > self.version:
+                return None
+            changed_keys = {key for key, (_, version) in self._sessions.items() if version > since}
+            removed = [key for key, version in self._removed.items() if version > since]
+        delta = {k: v for k, v in payload.items() if k != 'sessions'}
+        delta.update({
+            'delta': True,
+            'since': since,
+            'sessions': [s for s in payload.get('sessions', []) if session_key(s) in changed_keys],
+            'removed': removed
+        })
+        return delta
+
+session_versions = SessionVersions()
+
+def apply_session_delta(previous: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Fold a `?since=` delta response into the previously mirrored payload."""
+    sessions = {session_key(s): s for s in previous.get('sessions', [])}
+    for key in delta.get('removed', []):
+        sessions.pop(key, None)
+    for session in delta.get('sessions', []):
+        sessions[session_key(session)] = session
+    payload = {k: v for k, v in delta.items() if k not in ('delta', 'since', 'removed')}
+    payload['sessions'] = sorted(sessions.values(), key=lambda x: x.get('timestamp', 0), reverse=True)
+    return payload
+
+# Backend filtering and pagination. The sessions of each payload version are
+# indexed once, newest first, with per-status and per-device postings in the
+# same order, so a narrow view such as "Active, last 24h" walks only the few
+# sessions it returns instead of the whole history.
+QUERY_LIST_PARAMS = ('status', 'device', 'model')
+
+def _session_timestamp(session: Dict[str, Any]) -> float:
+    try:
+        return float(session.get('timestamp') or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def encode_cursor(sort_key: Tuple[float, str]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(sort_key)).encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    neg_ts, key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return float(neg_ts), str(key)
+
+def parse_time_arg(value: str) -> float:
+    """Epoch milliseconds or an ISO 8601 date/time, as epoch milliseconds."""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp() * 1000
+
+def parse_session_query(args: Any) -> Optional[Dict[str, Any]]:
+    """Filter/pagination parameters of a request, or None if there are none."""
+    query: Dict[str, Any] = {}
+    for name in QUERY_LIST_PARAMS:
+        if args.get(name):
+            query[name] = {v for v in args.get(name).split(',') if v}
+    if args.get('project'):
+        query['project'] = args.get('project')
+    for name in ('from', 'to'):
+        if args.get(name):
+            query[name] = parse_time_arg(args.get(name))
+    if args.get('limit'):
+        query['limit'] = max(1, int(args.get('limit')))
+    if args.get('cursor'):
+        query['cursor'] = decode_cursor(args.get('cursor'))
+    return query or None
+
+class SessionQueryIndex:
+    """One payload version's sessions, sorted newest first, with postings."""
+
+    def __init__(self, sessions: List[Dict[str, Any]]) -> None:
+        keyed = sorted(((-_session_timestamp(s), session_key(s)), s) for s in sessions) if sessions else []
+        self.keys = [k for k, _ in keyed]
+        self.neg_ts = [k[0] for k in self.keys]
+        self.sessions = [s for _, s in keyed]
+        self.by_status: Dict[str, List[int]] = {}
+        self.by_device: Dict[str, List[int]] = {}
+        for pos, session in enumerate(self.sessions):
+            self.by_status.setdefault(str(session.get('status')), []).append(pos)
+            self.by_device.setdefault(str(session.get('device_id', 'local')), []).append(pos)
+
+    def _postings(self, postings: Dict[str, List[int]], values: set) -> List[int]:
+        lists = [postings.get(v, []) for v in values]
+        return lists[0] if len(lists) == 1 else sorted(p for l in lists for p in l)
+
+    def query(self, query: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Return one page of matching sessions and the cursor for the next."""
+        limit = query.get('limit')
+        page = []
+        last_pos = 0 # only read once a full page has been collected
+        for pos, session in self._matches(query):
+            if limit is not None and len(page) == limit:
+                return page, encode_cursor(self.keys[last_pos])
+            page.append(session)
+            last_pos = pos
+        return page, None
+
+    def iter(self, query: Dict[str, Any]) -> Any:
+        """Every matching session, newest first, without building a list."""
+        for _, session in self._matches(query):
+            yield session
+
+    def _matches(self, query: Dict[str, Any]) -> Any:
+        # Time range and cursor bound a contiguous range of the sorted order
+        lo, hi = 0, len(self.sessions)
+        if 'to' in query:
+            lo = bisect.bisect_left(self.neg_ts, -query['to'])
+        if 'from' in query:
+            hi = bisect.bisect_right(self.neg_ts, -query['from'])
+        if 'cursor' in query:
+            lo = max(lo, bisect.bisect_right(self.keys, query['cursor']))
+
+        # Walk the narrowest posting list that applies
+        candidates = []
+        if 'status' in query:
+            candidates.append(self._postings(self.by_status, query['status']))
+        if 'device' in query:
+            candidates.append(self._postings(self.by_device, query['device']))
+        if candidates:
+            postings = min(candidates, key=len)
+            positions: Any = postings[bisect.bisect_left(postings, lo):bisect.bisect_left(postings, hi)]
+        else:
+            positions = range(lo, hi)
+
+        for pos in positions:
+            session = self.sessions[pos]
+            if 'status' in query and str(session.get('status')) not in query['status']:
+                continue
+            if 'device' in query and str(session.get('device_id', 'local')) not in query['device']:
+                continue
+            if 'model' in query and session.get('model') not in query['model']:
+                continue
+            if 'project' in query and not str(session.get('project_path', '')).startswith(query['project']):
+                continue
+            yield pos, session
+
+_query_index: Optional[Tuple[Tuple[str, int], SessionQueryIndex]] = None
+_query_index_lock = threading.Lock()
+
+def session_query_index(payload: Dict[str, Any]) -> SessionQueryIndex:
+    """Index for the payload's version, rebuilt only when the version moves."""
+    global _query_index
+    version = (payload['epoch'], payload['version'])
+    with _query_index_lock:
+        if _query_index is None or _query_index[0] != version:
+            _query_index = (version, SessionQueryIndex(payload.get('sessions', [])))
+        return _query_index[1]
+
+def to_int(value: object) -> int:
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(float(value))
+        except ValueError:
+            return 0
+    return 0
+
+def to_float(value: object) -> float:
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return 0.0
+    return 0.0
+
+# Overall agent/model/device counters across all sessions. Each session's
+# contribution is remembered along with the stats objects it was computed
+# from; cached sessions hand back the same objects until they change, so an
+# unchanged session costs an identity check and a changed one subtracts its
+# old rows and adds the new ones.
+DEVICE_STATS_FIELDS = ('sessions', 'tokens', 'cost')
+
+class CounterTable:
+    """Fixed-layout counter rows indexed by interned name ids."""
+
+    def __init__(self, fields: Tuple[str, ...]) -> None:
+        self.fields = fields
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.rows: List[List[float]] = []
+        self.refs: List[int] = [] # contributing sessions per id
+
+    def intern(self, name: str) -> int:
+        name_id = self.ids.get(name)
+        if name_id is None:
+            name_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+            self.rows.append([0] * (len(self.fields) - 1) + [0.0])
+            self.refs.append(0)
+        return name_id
+
+    def row(self, values: Dict[str, Any]) -> List[float]:
+        """Coerce one {field: value} entry into a row, once per change."""
+        row: List[float] = [to_int(values.get(field)) for field in self.fields[:-1]]
+        row.append(to_float(values.get(self.fields[-1])))
+        return row
+
+    def apply(self, rows: List[Tuple[int, List[float]]], sign: int) -> None:
+        for name_id, row in rows:
+            target = self.rows[name_id]
+            for i, value in enumerate(row):
+                target[i] += sign * value
+            self.refs[name_id] += sign
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: dict(zip(self.fields, row))
+            for name, row, refs in zip(self.names, self.rows, self.refs) if refs > 0
+        }
+
+class SessionAggregates:
+    """Incrementally maintained overall agent/model/device stats."""
+
+    def __init__(self) -> None:
+        self.agents = CounterTable(STATS_FIELDS)
+        self.models = CounterTable(STATS_FIELDS)
+        self.devices = CounterTable(DEVICE_STATS_FIELDS)
+        self._lock = threading.Lock()
+        # session key -> (change token, contribution)
+        self._sources: Dict[str, Tuple[Tuple[Any, ...], Tuple[List[Any], ...]]] = {}
+        self._device_names: Dict[str, str] = {}
+        self._metrics: Optional[Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]] = None
+
+    def _contribution(self, session: Dict[str, Any]) -> Tuple[List[Any], ...]:
+        agent_stats = session.get('agent_stats') or {}
+        model_stats = session.get('model_stats') or {}
+        device_id = session.get('device_id', 'local')
+        return (
+            [(self.agents.intern(k), self.agents.row(v)) for k, v in agent_stats.items() if isinstance(v, dict)],
+            [(self.models.intern(k), self.models.row(v)) for k, v in model_stats.items() if isinstance(v, dict)],
+            [(self.devices.intern(device_id), [1, to_int(session.get('total_tokens')), to_float(session.get('cost_val'))])]
+        )
+
+    def _apply(self, contribution: Tuple[List[Any], ...], sign: int) -> None:
+        agents, models, devices = contribution
+        self.agents.apply(agents, sign)
+        self.models.apply(models, sign)
+        self.devices.apply(devices, sign)
+
+    def update(self, sessions: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+        """Bring the counters in line with `sessions`; returns agent, model and device stats."""
+        with self._lock:
+            changed = False
+            live = set()
+            for session in sessions:
+                key = session_key(session)
+                live.add(key)
+                token = (session.get('agent_stats'), session.get('model_stats'),
+                         session.get('total_tokens'), session.get('cost_val'))
+                previous = self._sources.get(key)
+                if previous is not None and all(a is b for a, b in zip(previous[0], token)):
+                    continue
+                contribution = self._contribution(session)
+                if previous is not None:
+                    self._apply(previous[1], -1)
+                self._apply(contribution, 1)
+                self._sources[key] = (token, contribution)
+                self._device_names[session.get('device_id', 'local')] = session.get('device_name', '')
+                changed = True
+            for key in [k for k in self._sources if k not in live]:
+                self._apply(self._sources.pop(key)[1], -1)
+                changed = True
+            if changed or self._metrics is None:
+                device_stats = self.devices.to_dict()
+                for device_id, stats in device_stats.items():
+                    stats['name'] = self._device_names.get(device_id, device_id)
+                self._metrics = (self.agents.to_dict(), self.models.to_dict(), device_stats)
+            return self._metrics
+
+session_aggregates = SessionAggregates()
+
+# Per-day counters kept in the payload, so upstream aggregators can take
+# "today" from a pushed rollup. Sessions count on their start day; local
+# tokens and cost on each message's own day, from the time-series day
+# buckets. Pulled devices and pushed rollups contribute the daily_stats they
+# computed the same way; only a pulled device too old to report them falls
+# back to counting its sessions' totals on their start day.
+DAILY_STATS_DAYS = int(os.environ.get('DASHBOARD_DAILY_STATS_DAYS', '31'))
+
+def count_session_day(daily_stats: Dict[str, Dict[str, Any]], session: Dict[str, Any], cutoff: str,
+                      spend: bool = True) -> None:
+    timestamp = to_float(session.get('timestamp'))
+    if timestamp <= 0:
+        return
+    day = datetime.fromtimestamp(timestamp / 1000).date().isoformat()
+    if day < cutoff:
+        return
+    stats = daily_stats.get(day)
+    if stats is None:
+        stats = daily_stats[day] = {'sessions': 0, 'tokens': 0, 'cost': 0.0}
+    stats['sessions'] += 1
+    if spend:
+        stats['tokens'] += to_int(session.get('total_tokens'))
+        stats['cost'] += to_float(session.get('cost_val'))
+
+def merge_day_stats(daily_stats: Dict[str, Dict[str, Any]], days: Dict[str, Any], cutoff: str) -> None:
+    """Fold another node's daily_stats into ours, skipping days before the cutoff."""
+    for day, day_stats in days.items():
+        if not isinstance(day_stats, dict) or day < cutoff:
+            continue
+        stats = daily_stats.get(day)
+        if stats is None:
+            stats = daily_stats[day] = {'sessions': 0, 'tokens': 0, 'cost': 0.0}
+        stats['sessions'] += to_int(day_stats.get('sessions'))
+        stats['tokens'] += to_int(day_stats.get('tokens'))
+        stats['cost'] += to_float(day_stats.get('cost'))
+
+def add_local_day_spend(daily_stats: Dict[str, Dict[str, Any]], since: datetime) -> None:
+    """Fold local tokens and cost into daily_stats by message day."""
+    series = timeseries_rollup.query('day', since.timestamp() * 1000, float('inf'), None, {})
+    for bucket, tokens, cost, _ in series.get('total', []):
+        day = datetime.fromtimestamp(bucket / 1000).date().isoformat()
+        stats = daily_stats.get(day)
+        if stats is None:
+            stats = daily_stats[day] = {'sessions': 0, 'tokens': 0, 'cost': 0.0}
+        stats['tokens'] += tokens
+        stats['cost'] += cost
+
+def build_sessions_payload() -> Dict[str, Any]:
+    """Collect local and remote sessions plus the aggregate metrics block."""
+    sessions_data = []
+
+    def is_recent(timestamp_val: object, today_start_ts_val: int) -> bool:
+        if isinstance(timestamp_val, bool):
+            return int(timestamp_val) > today_start_ts_val
+        if isinstance(timestamp_val, (int, float)):
+            return int(timestamp_val) > today_start_ts_val
+        if isinstance(timestamp_val, str):
+            try:
+                return int(float(timestamp_val)) > today_start_ts_val
+            except ValueError:
+                return False
+        return False
+
+    # Daily aggregation
+    today_start: datetime = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    today_start_ts: int = int(today_start.timestamp() * 1000)
+    
+    today_cost: float = 0.0
+    today_tokens: int = 0
+    active_count: int = 0
+    daily_stats: Dict[str, Dict[str, Any]] = {}
+    daily_cutoff = (today_start - timedelta(days=DAILY_STATS_DAYS - 1)).date().isoformat()
+    today_key = today_start.date().isoformat()
+    
+    config = load_config()
+    devices = config.get('devices', [])
+    device_status = []
+
+    # Kick off remote fetches first so they overlap with the local scan
+    deadline = time.monotonic() + REMOTE_DEADLINE
+    remote_fetches = []
+    for device in devices:
+        if not device.get('enabled', True):
+            continue
+            
+        device_id = device.get('id', 'unknown')
+        device_name = device.get('name', device_id)
+        device_url = device.get('url', '')
+        
+        if device_url != 'local':
+            state = remote_device_state(device_url)
+            remote_fetches.append((device_id, device_name, state, state.refresh(device)))
+
+    local_sessions = []
+    if os.path.exists(DATA_DIR):
+        local_started = time.monotonic()
+        try:
+            with timed('local_scan'):
+                local_sessions = iter_local_sessions()
+        except Exception as e:
+            return {"error": str(e)}
+        device_status.append({
+            'id': 'local',
+            'name': '本地设备',
+            'status': 'ok',
+            'latency_ms': int((time.monotonic() - local_started) * 1000),
+            'error': None,
+            'sessions': len(local_sessions)
+        })
+
+    grace_deadline = time.monotonic() + REMOTE_GRACE
+    now = datetime.now()
+    for device_id, device_name, state, future in remote_fetches:
+        if future is not None:
+            # Wait for the first payload up to the deadline; afterwards give the
+            # refresh only a short grace period before serving the cached copy.
+            has_cached = state.cached()[0] is not None
+            try:
+                with timed('remote_wait'):
+                    future.result(timeout=max(0.0, (grace_deadline if has_cached else deadline) - time.monotonic()))
+            except FutureTimeoutError:
+                pass
+        remote_data, age = state.cached()
+        remote_sessions = remote_data.get('sessions', []) if remote_data else []
+        remote_metrics = remote_data.get('metrics') if remote_data else None
+        remote_days = remote_metrics.get('daily_stats') if isinstance(remote_metrics, dict) else None
+        if isinstance(remote_days, dict):
+            # Already split by message day on the device, like a pushed rollup
+            merge_day_stats(daily_stats, remote_days, daily_cutoff)
+            today = remote_days.get(today_key)
+            if isinstance(today, dict):
+                today_cost += to_float(today.get('cost'))
+                today_tokens += to_int(today.get('tokens'))
+        status = state.health()
+        status.update({
+            'id': device_id,
+            'name': device_name,
+            'age_s': round(age, 1) if age is not None else None,
+            'sessions': len(remote_sessions)
+        })
+        device_status.append(status)
+        for session in remote_sessions:
+            # Copy: the cached payload is shared with later requests
+            session = dict(session)
+            if session.get('last_activity_ms'):
+                set_time_since_fields(session, session['last_activity_ms'], now)
+            session['device_id'] = device_id
+            session['device_name'] = device_name
+            sessions_data.append(session)
+
+            if session.get('status') == 'Active':
+                active_count += 1
+            
+            if not isinstance(remote_days, dict):
+                if is_recent(session.get('timestamp'), today_start_ts):
+                    today_cost += to_float(session.get('cost_val'))
+                    today_tokens += to_int(session.get('total_tokens'))
+                count_session_day(daily_stats, session, daily_cutoff)
+
+    for stats_dict in local_sessions:
+        stats_dict['device_id'] = 'local'
+        stats_dict['device_name'] = '本地设备'
+        sessions_data.append(stats_dict)
+
+        stats_status = stats_dict.get('status')
+        if stats_status == 'Active':
+            active_count += 1
+        count_session_day(daily_stats, stats_dict, daily_cutoff, spend=False)
+    if local_sessions:
+        # A local session spanning midnight splits its spend across the days
+        local_days: Dict[str, Dict[str, Any]] = {}
+        add_local_day_spend(local_days, today_start - timedelta(days=DAILY_STATS_DAYS - 1))
+        local_today = local_days.get(today_key, {})
+        today_cost += to_float(local_today.get('cost'))
+        today_tokens += to_int(local_today.get('tokens'))
+        _merge_table(daily_stats, local_days)
+
+    overall_agent_stats, overall_model_stats, device_stats = session_aggregates.update(sessions_data)
+
+    # Pushed rollups are folded in whole; they list only their active sessions
+    rollups = rollup_registry.live()
+    if rollups:
+        # The aggregates are cached across builds, so merge into copies
+        overall_agent_stats = {name: dict(stats) for name, stats in overall_agent_stats.items()}
+        overall_model_stats = {name: dict(stats) for name, stats in overall_model_stats.items()}
+        device_stats = dict(device_stats)
+        for rollup, age in rollups:
+            _merge_table(overall_agent_stats, rollup['agent_stats'])
+            _merge_table(overall_model_stats, rollup['model_stats'])
+            merge_day_stats(daily_stats, rollup['daily_stats'], daily_cutoff)
+            device_stats.update(rollup['device_stats'])
+            today = rollup['daily_stats'].get(today_key)
+            if isinstance(today, dict):
+                today_cost += to_float(today.get('cost'))
+                today_tokens += to_int(today.get('tokens'))
+            active_count += to_int(rollup.get('active_count'))
+            device_status.append({
+                'id': rollup['node'],
+                'name': rollup.get('name', rollup['node']),
+                'mode': 'push',
+                'status': 'ok',
+                'error': None,
+                'age_s': round(age, 1),
+                'devices': sorted(rollup['device_stats']),
+                'sessions': sum(to_int(stats.get('sessions')) for stats in rollup['device_stats'].values())
+            })
+            for session in rollup['sessions']:
+                session = dict(session)
+                if session.get('last_activity_ms'):
+                    set_time_since_fields(session, session['last_activity_ms'], now)
+                sessions_data.append(session)
+
+    # Sort by timestamp descending (newest first)
     sessions_data.sort(key=lambda x: x['timestamp'], reverse=True)
     
-    return jsonify({
+    payload = {
         "sessions": sessions_data,
         "metrics": {
             "today_cost": f"${today_cost:.2f}",
             "today_tokens": today_tokens,
             "active_count": active_count,
             "agent_stats": overall_agent_stats,
-            "model_stats": overall_model_stats
+            "model_stats": overall_model_stats,
+            "device_stats": device_stats,
+            "daily_stats": dict(sorted(daily_stats.items()))
+        },
+        "device_status": device_status
+    }
+    session_versions.update(payload)
+    return payload
+
+# Background ingestion. A scheduler thread rebuilds the sessions payload on
+# its own cadence, faster while any session is active (the files of idle
+# sessions are still only fingerprinted every INGEST_IDLE_INTERVAL), and
+# publishes each result as a snapshot that readers treat as immutable. /api/sessions serves
+# the latest snapshot without doing any work, and concurrent refreshes share
+# one in-flight build instead of scanning in parallel.
+INGEST_ACTIVE_INTERVAL = float(os.environ.get('DASHBOARD_INGEST_ACTIVE_INTERVAL', '2'))
+INGEST_IDLE_INTERVAL = float(os.environ.get('DASHBOARD_INGEST_IDLE_INTERVAL', '10'))
+# Stop refreshing after this long without readers; the next one refreshes inline
+INGEST_PAUSE_AFTER = float(os.environ.get('DASHBOARD_INGEST_PAUSE_AFTER', '300'))
+
+class IngestScheduler:
+    """Single-flight payload builder publishing snapshots for readers."""
+
+    def __init__(self, active_interval: float = INGEST_ACTIVE_INTERVAL, idle_interval: float = INGEST_IDLE_INTERVAL,
+                 pause_after: float = INGEST_PAUSE_AFTER) -> None:
+        self.active_interval = active_interval
+        self.idle_interval = idle_interval
+        self.pause_after = pause_after
+        self._cond = threading.Condition()
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._inflight: Optional[Future] = None
+        self._published_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._last_read = time.monotonic()
+        self._wake = threading.Event()
+
+    def refresh(self) -> Dict[str, Any]:
+        """Build and publish a payload, or join the build already running."""
+        with self._cond:
+            future = self._inflight
+            leader = future is None
+            if leader:
+                future = self._inflight = Future()
+        assert future is not None
+        if not leader:
+            return future.result()
+        try:
+            with timed('ingest'):
+                payload = build_sessions_payload()
+        except Exception as e:
+            app.logger.exception("Session ingest failed")
+            payload = {"error": str(e)}
+        with self._cond:
+            if 'error' not in payload or self._snapshot is None:
+                self._snapshot = payload
+                self._published_at = time.monotonic()
+            self._inflight = None
+            self._cond.notify_all()
+        future.set_result(payload)
+        if 'error' not in payload:
+            try:
+                alert_engine.evaluate(payload)
+            except Exception:
+                app.logger.exception("Alert evaluation failed")
+        return payload
+
+    def snapshot(self) -> Dict[str, Any]:
+        """The latest published payload; only the first reader waits for a build."""
+        self._ensure_started()
+        with self._cond:
+            paused = time.monotonic() - self._last_read > self.pause_after
+            self._last_read = time.monotonic()
+            snapshot = self._snapshot
+        if snapshot is None or paused:
+            self._wake.set()
+            return self.refresh()
+        return snapshot
+
+    def poke(self) -> None:
+        """Rebuild now instead of at the next tick, e.g. after a watched change."""
+        self._wake.set()
+
+    def age(self) -> Optional[float]:
+        published_at = self._published_at
+        return time.monotonic() - published_at if published_at is not None else None
+
+    def wait_newer(self, previous: Optional[Dict[str, Any]], timeout: float) -> Optional[Dict[str, Any]]:
+        """Block until a snapshot other than `previous` is published."""
+        self._ensure_started()
+        with self._cond:
+            self._last_read = time.monotonic()
+            self._cond.wait_for(lambda: self._snapshot is not None and self._snapshot is not previous, timeout)
+            return self._snapshot if self._snapshot is not previous else None
+
+    def _ensure_started(self) -> None:
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='session-ingest', daemon=True)
+                self._thread.start()
+        # Started here too, not only in serve(), so gunicorn workers push as well
+        if rollup_pusher is not None:
+            rollup_pusher.start()
+
+    def _run(self) -> None:
+        while True:
+            while time.monotonic() - self._last_read > self.pause_after:
+                self._wake.wait(self.idle_interval)
+                self._wake.clear()
+            payload = self.refresh()
+            active = payload.get('metrics', {}).get('active_count', 0) > 0
+            self._wake.wait(self.active_interval if active else self.idle_interval)
+            self._wake.clear()
+
+ingest_scheduler = IngestScheduler()
+
+# Alerting. Every published snapshot is checked against budget and anomaly
+# rules, but only sessions whose figures changed are looked at again, using
+# a short sliding window of samples per session (keyed by message time, so
+# the ingest cadence does not skew rates). Events go to the log, optionally a
+# JSON-lines file and a webhook, and the latest ones are kept for /api/alerts.
+# A rule fires once when its condition starts to hold and re-arms once it
+# clears. Budgets of 0 are disabled.
+ALERT_SESSION_BUDGET = float(os.environ.get('DASHBOARD_ALERT_SESSION_BUDGET') or 0)
+ALERT_DAILY_BUDGET = float(os.environ.get('DASHBOARD_ALERT_DAILY_BUDGET') or 0)
+ALERT_TOKEN_RATE = float(os.environ.get('DASHBOARD_ALERT_TOKEN_RATE') or 50000) # tokens per minute
+ALERT_WINDOW = float(os.environ.get('DASHBOARD_ALERT_WINDOW') or 300) # seconds of message time
+ALERT_CONTEXT_PERCENT = float(os.environ.get('DASHBOARD_ALERT_CONTEXT_PERCENT') or 90)
+ALERT_CONTEXT_ETA = float(os.environ.get('DASHBOARD_ALERT_CONTEXT_ETA') or 600) # predicted seconds to overflow
+ALERT_REPEATED_FAILURES = int(os.environ.get('DASHBOARD_ALERT_REPEATED_FAILURES') or 3)
+ALERT_WEBHOOK = os.environ.get('DASHBOARD_ALERT_WEBHOOK', '')
+ALERT_LOG = os.path.expanduser(os.environ.get('DASHBOARD_ALERT_LOG', ''))
+ALERT_HISTORY = 200
+
+class AlertEngine:
+    """Incremental rule evaluation over published session snapshots."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # session key -> {'token': change token, 'samples': deque of (ms, tokens, context, failures)}
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._firing: set = set() # (rule, subject) pairs currently holding
+        self.history: 'collections.deque[Dict[str, Any]]' = collections.deque(maxlen=ALERT_HISTORY)
+
+    def evaluate(self, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        events: List[Dict[str, Any]] = []
+        with self._lock:
+            live = set()
+            for session in payload.get('sessions', []):
+                key = session_key(session)
+                live.add(key)
+                token = (session.get('last_activity_ms'), session.get('total_tokens'), session.get('cost_val'),
+                         session.get('current_turn_context'), session.get('status'))
+                state = self._sessions.get(key)
+                if state is not None and state['token'] == token:
+                    continue
+                first = state is None
+                if state is None:
+                    state = self._sessions[key] = {'samples': collections.deque()}
+                state['token'] = token
+                self._check_session(key, session, state, first, events)
+            for key in [k for k in self._sessions if k not in live]:
+                del self._sessions[key]
+                self._firing = {f for f in self._firing if f[1] != key}
+
+            # Local, pulled and pushed spend is bucketed by message time (add_local_day_spend)
+            today = datetime.now().date().isoformat()
+            spent = to_float(payload.get('metrics', {}).get('daily_stats', {}).get(today, {}).get('cost'))
+            self._set(events, 'daily_budget', today, ALERT_DAILY_BUDGET > 0 and spent >= ALERT_DAILY_BUDGET, False, {
+                'severity': 'critical', 'value': round(spent, 4), 'threshold': ALERT_DAILY_BUDGET,
+                'message': f"Spend today ${spent:.2f} reached the daily budget ${ALERT_DAILY_BUDGET:.2f}"
+            })
+        if events:
+            self._emit(events)
+        return events
+
+    def _set(self, events: List[Dict[str, Any]], rule: str, subject: str, holds: bool, quiet: bool,
+             event: Dict[str, Any], session: Optional[Dict[str, Any]] = None) -> None:
+        """Fire `rule` for `subject` on a rising edge; `quiet` arms it without an event."""
+        marker = (rule, subject)
+        if not holds:
+            self._firing.discard(marker)
+            return
+        if marker in self._firing:
+            return
+        self._firing.add(marker)
+        if quiet:
+            return
+        event = dict(event, rule=rule, timestamp=int(time.time() * 1000))
+        if session is not None:
+            event.update({
+                'session_id': session.get('id'),
+                'session_name': session.get('name'),
+                'device_id': session.get('device_id', 'local'),
+                'model': session.get('model')
+            })
+        events.append(event)
+
+    def _check_session(self, key: str, session: Dict[str, Any], state: Dict[str, Any], first: bool,
+                       events: List[Dict[str, Any]]) -> None:
+        at = to_float(session.get('last_activity_ms'))
+        tokens = to_int(session.get('total_tokens'))
+        context = to_int(session.get('current_turn_context'))
+        model_stats = session.get('model_stats')
+        failures = None
+        if isinstance(model_stats, dict):
+            failures = sum(to_int(v.get('failed')) + to_int(v.get('length')) for v in model_stats.values() if isinstance(v, dict))
+        samples = state['samples']
+        samples.append((at, tokens, context, failures))
+        # Keep one sample at or before the window start as the baseline
+        while len(samples) > 1 and samples[1][0] <= at - ALERT_WINDOW * 1000:
+            samples.popleft()
+        active = session.get('status') == 'Active'
+        # History seen for the first time (startup, a new device) only arms the rules
+        quiet = first and not active
+
+        cost = to_float(session.get('cost_val'))
+        self._set(events, 'session_budget', key, ALERT_SESSION_BUDGET > 0 and cost >= ALERT_SESSION_BUDGET, quiet, {
+            'severity': 'critical', 'value': round(cost, 4), 'threshold': ALERT_SESSION_BUDGET,
+            'message': f"Session cost ${cost:.2f} reached the per-session budget ${ALERT_SESSION_BUDGET:.2f}"
+        }, session)
+        if first:
+            # No window yet: rates and trends start from this baseline
+            return
+
+        base_at, base_tokens, base_context, base_failures = samples[0]
+        span_ms = at - base_at
+        # Tokens since the baseline over at most the window, and at least a
+        # minute so a single large message is not read as a runaway rate
+        elapsed_ms = max(min(span_ms, ALERT_WINDOW * 1000), 60000)
+        rate = (tokens - base_tokens) / elapsed_ms * 60000
+        self._set(events, 'token_rate', key, active and rate >= ALERT_TOKEN_RATE, quiet, {
+            'severity': 'warning', 'value': int(rate), 'threshold': ALERT_TOKEN_RATE,
+            'message': f"Runaway token rate: {int(rate)} tokens/min over the last {int(elapsed_ms / 1000)}s"
+        }, session)
+
+        window = to_int(session.get('context_window'))
+        eta = None
+        if span_ms > 0 and context > base_context:
+            eta = max(0, window - context) / ((context - base_context) / span_ms) / 1000
+        percent = context / window * 100 if window > 0 else 0
+        self._set(events, 'context_overflow', key,
+                  active and window > 0 and (percent >= ALERT_CONTEXT_PERCENT or (eta is not None and eta <= ALERT_CONTEXT_ETA)),
+                  quiet, {
+                      'severity': 'critical' if context >= window else 'warning',
+                      'value': int(percent), 'threshold': ALERT_CONTEXT_PERCENT,
+                      'eta_s': int(eta) if eta is not None else None,
+                      'message': f"Context at {int(percent)}% of {window} tokens" +
+                                 (f", full in about {int(eta)}s at the current growth" if eta is not None else "")
+                  }, session)
+
+        if failures is not None and base_failures is not None:
+            repeated = failures - base_failures
+            self._set(events, 'repeated_failures', key, repeated >= ALERT_REPEATED_FAILURES, quiet, {
+                'severity': 'warning', 'value': repeated, 'threshold': ALERT_REPEATED_FAILURES,
+                'message': f"{repeated} failed or length-truncated calls within {int(ALERT_WINDOW)}s"
+            }, session)
+
+    def _emit(self, events: List[Dict[str, Any]]) -> None:
+        for event in events:
+            self.history.append(event)
+            metrics.inc('ocmonitor_alerts_total', rule=event['rule'])
+            app.logger.warning("Alert %s: %s", event['rule'], event['message'])
+        if ALERT_LOG:
+            try:
+                with open(ALERT_LOG, 'a') as f:
+                    for event in events:
+                        f.write(json.dumps(event, ensure_ascii=False) + '\n')
+            except OSError as e:
+                app.logger.warning("Cannot write alert log %s: %s", ALERT_LOG, e)
+        if ALERT_WEBHOOK:
+            # Off the ingest thread; a slow receiver must not delay snapshots
+            remote_pool.submit(self._post, events)
+
+    def _post(self, events: List[Dict[str, Any]]) -> None:
+        try:
+            response = http_session.post(ALERT_WEBHOOK, json={'alerts': events}, timeout=REMOTE_TIMEOUT)
+            status = 'ok' if response.ok else f"HTTP {response.status_code}"
+        except requests.RequestException as e:
+            status = type(e).__name__
+        if status != 'ok':
+            app.logger.warning("Alert webhook %s failed: %s", ALERT_WEBHOOK, status)
+        metrics.inc('ocmonitor_alert_webhook_total', status=status)
+
+alert_engine = AlertEngine()
+
+@app.route('/api/alerts')
+def alerts():
+    limit = ALERT_HISTORY
+    if request.args.get('limit'):
+        try:
+            limit = int(request.args['limit'])
+        except ValueError as e:
+            return jsonify({"error": f"invalid query: {e}"}), 400
+        if limit <= 0:
+            return jsonify({"error": "invalid query: limit must be positive"}), 400
+    return jsonify({
+        "alerts": list(alert_engine.history)[-limit:][::-1],
+        "rules": {
+            "session_budget": ALERT_SESSION_BUDGET,
+            "daily_budget": ALERT_DAILY_BUDGET,
+            "token_rate": ALERT_TOKEN_RATE,
+            "window_s": ALERT_WINDOW,
+            "context_percent": ALERT_CONTEXT_PERCENT,
+            "context_eta_s": ALERT_CONTEXT_ETA,
+            "repeated_failures": ALERT_REPEATED_FAILURES
         }
     })
 
+# List responses carry only what a session row needs. ?view=full keeps every
+# field (aggregators fold per-session agent/model stats from it), and
+# /api/sessions/<id> computes the rich per-message detail on demand.
+SESSION_DETAIL_FIELDS = ('models_used', 'agent_stats', 'model_stats', 'latest_preview', 'latest_duration', 'recent_tokens')
+
+_summary_cache: Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]] = None
+_summary_cache_lock = threading.Lock()
+
+def summarize_session(session: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in session.items() if k not in SESSION_DETAIL_FIELDS}
+
+def summarize_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop the detail fields from every session list in a payload or diff."""
+    global _summary_cache
+    body = dict(payload)
+    for key in ('sessions', 'added', 'changed'):
+        sessions = body.get(key)
+        if not isinstance(sessions, list):
+            continue
+        # Published snapshots keep their session list, so summarize it once
+        with _summary_cache_lock:
+            if _summary_cache is not None and _summary_cache[0] is sessions:
+                body[key] = _summary_cache[1]
+                continue
+        body[key] = [summarize_session(s) for s in sessions]
+        if key == 'sessions' and not payload.get('delta') and 'next_cursor' not in payload:
+            with _summary_cache_lock:
+                _summary_cache = (sessions, body[key])
+    return body
+
+# Hierarchical aggregation. Instead of being polled for every session, a node
+# with DASHBOARD_UPSTREAM set pushes a compact rollup of its payload (the
+# overall agent/model/device/day counters plus only its active sessions) to
+# each upstream's /api/rollups whenever it changes. The receiving aggregator
+# folds rollups in whole, so a refresh costs O(nodes) rather than O(sessions),
+# and since a rollup is built from the payload, which already includes the
+# rollups a node received, aggregators can be chained.
+PUSH_UPSTREAMS = [u.strip().rstrip('/') for u in os.environ.get('DASHBOARD_UPSTREAM', '').split(',') if u.strip()]
+NODE_ID = os.environ.get('DASHBOARD_NODE_ID') or socket.gethostname()
+NODE_NAME = os.environ.get('DASHBOARD_NODE_NAME') or NODE_ID
+# Where upstreams can reach this node for session detail; optional
+PUBLIC_URL = os.environ.get('DASHBOARD_PUBLIC_URL', '').rstrip('/')
+# Shared secret for pushes; when set, /api/rollups requires it as a bearer token
+PUSH_TOKEN = os.environ.get('DASHBOARD_PUSH_TOKEN', '')
+# Re-push an unchanged rollup this often so the upstream keeps it fresh
+PUSH_HEARTBEAT = float(os.environ.get('DASHBOARD_PUSH_HEARTBEAT', '60'))
+# Largest rollup accepted, both as sent and after gunzipping
+ROLLUP_MAX_BYTES = int(os.environ.get('DASHBOARD_ROLLUP_MAX_MB', '32')) * 1024 * 1024
+app.config['MAX_CONTENT_LENGTH'] = ROLLUP_MAX_BYTES
+
+def build_rollup(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Compact rollup of a sessions payload, with 'local' renamed to this node."""
+    block = payload.get('metrics', {})
+    devices = {}
+    for device_id, stats in block.get('device_stats', {}).items():
+        if device_id == 'local':
+            device_id, stats = NODE_ID, dict(stats, name=NODE_NAME)
+            if PUBLIC_URL:
+                stats['url'] = PUBLIC_URL
+        devices[device_id] = stats
+    active = []
+    for session in payload.get('sessions', []):
+        if session.get('status') != 'Active':
+            continue
+        session = {k: v for k, v in session.items() if k not in SESSION_DETAIL_FIELDS + VOLATILE_SESSION_FIELDS}
+        if session.get('device_id', 'local') == 'local':
+            session.update({'device_id': NODE_ID, 'device_name': NODE_NAME})
+        active.append(session)
+    return {
+        'node': NODE_ID,
+        'name': NODE_NAME,
+        'active_count': block.get('active_count', 0),
+        'agent_stats': block.get('agent_stats', {}),
+        'model_stats': block.get('model_stats', {}),
+        'device_stats': devices,
+        'daily_stats': block.get('daily_stats', {}),
+        'sessions': active
+    }
+
+class RollupRegistry:
+    """Latest rollup pushed by each downstream node."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._rollups: Dict[str, Tuple[Dict[str, Any], float]] = {} # node -> (rollup, received at)
+
+    def receive(self, rollup: Dict[str, Any]) -> None:
+        for field in ('agent_stats', 'model_stats', 'device_stats', 'daily_stats'):
+            if not isinstance(rollup.get(field), dict):
+                raise ValueError(f"{field} must be an object")
+        if not isinstance(rollup.get('sessions'), list):
+            raise ValueError("sessions must be a list")
+        node = rollup.get('node')
+        if not isinstance(node, str) or not node:
+            raise ValueError("node is required")
+        if node == NODE_ID or NODE_ID in rollup['device_stats']:
+            raise ValueError(f"rollup from {node} already includes this node")
+        with self._lock:
+            self._rollups[node] = (rollup, time.time())
+        metrics.inc('ocmonitor_rollups_received_total', node=node)
+
+    def live(self) -> List[Tuple[Dict[str, Any], float]]:
+        """Rollups with their age in seconds, dropping those not refreshed in time."""
+        now = time.time()
+        with self._lock:
+            for node in [n for n, (_, at) in self._rollups.items() if now - at > REMOTE_MAX_STALE]:
+                del self._rollups[node]
+            return [(rollup, now - at) for rollup, at in self._rollups.values()]
+
+    def device(self, device_id: str) -> Optional[Dict[str, Any]]:
+        """A pushed device that advertised a URL, shaped like a config entry."""
+        for rollup, _ in self.live():
+            stats = rollup['device_stats'].get(device_id)
+            if isinstance(stats, dict) and stats.get('url'):
+                return {'id': device_id, 'name': stats.get('name', device_id), 'url': stats['url']}
+        return None
+
+rollup_registry = RollupRegistry()
+
+class RollupPusher:
+    """Pushes this node's rollup upstream after each changed snapshot."""
+
+    def __init__(self, upstreams: List[str]) -> None:
+        self.upstreams = upstreams
+        self._pushed: Dict[str, Tuple[int, float]] = {} # upstream -> (fingerprint, pushed at)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='rollup-push', daemon=True)
+                self._thread.start()
+
+    def push(self, payload: Dict[str, Any]) -> None:
+        rollup = build_rollup(payload)
+        body = json.dumps(rollup, separators=(',', ':'), default=str).encode()
+        fingerprint = hash(body)
+        headers = {'Content-Type': 'application/json', 'Content-Encoding': 'gzip'}
+        if PUSH_TOKEN:
+            headers['Authorization'] = f"Bearer {PUSH_TOKEN}"
+        compressed = None
+        for upstream in self.upstreams:
+            last = self._pushed.get(upstream)
+            if last is not None and last[0] == fingerprint and time.monotonic() - last[1] < PUSH_HEARTBEAT:
+                continue
+            if compressed is None:
+                compressed = gzip.compress(body, compresslevel=6)
+            try:
+                response = http_session.post(f"{upstream}/api/rollups", data=compressed, headers=headers, timeout=REMOTE_TIMEOUT)
+                status = 'ok' if response.status_code == 204 else f"HTTP {response.status_code}"
+            except requests.RequestException as e:
+                status = type(e).__name__
+            metrics.inc('ocmonitor_rollup_push_total', upstream=upstream, status=status)
+            if status == 'ok':
+                self._pushed[upstream] = (fingerprint, time.monotonic())
+            else:
+                # Retried with the next snapshot or heartbeat
+                self._pushed.pop(upstream, None)
+                app.logger.warning("Rollup push to %s failed: %s", upstream, status)
+
+    def _run(self) -> None:
+        payload = None
+        while True:
+            # Waiting on the scheduler also counts as a reader, so ingest keeps running
+            payload = ingest_scheduler.wait_newer(payload, PUSH_HEARTBEAT) or payload
+            if payload is None or 'error' in payload:
+                continue
+            try:
+                self.push(payload)
+            except Exception:
+                app.logger.exception("Rollup push failed")
+
+rollup_pusher = RollupPusher(PUSH_UPSTREAMS) if PUSH_UPSTREAMS else None
+
+@app.route('/api/rollups', methods=['POST'])
+def receive_rollup():
+    if PUSH_TOKEN and not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {PUSH_TOKEN}"):
+        return jsonify({"error": "unauthorized"}), 401
+    if request.content_length is not None and request.content_length > ROLLUP_MAX_BYTES:
+        return jsonify({"error": "rollup too large"}), 413
+    try:
+        body = request.get_data()
+        if request.headers.get('Content-Encoding') == 'gzip':
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            try:
+                body = decompressor.decompress(body, ROLLUP_MAX_BYTES + 1)
+            except zlib.error as e:
+                raise ValueError(e)
+            if len(body) > ROLLUP_MAX_BYTES:
+                return jsonify({"error": "rollup too large"}), 413
+            if not decompressor.eof:
+                raise ValueError("truncated gzip body")
+        rollup = json_loads(body)
+        if not isinstance(rollup, dict):
+            raise ValueError("rollup must be an object")
+        rollup_registry.receive(rollup)
+    except (OSError, ValueError, TypeError) as e:
+        return jsonify({"error": f"invalid rollup: {e}"}), 400
+    return Response(status=204)
+
+@app.route('/api/sessions')
+def sessions():
+    try:
+        query = parse_session_query(request.args)
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"invalid query: {e}"}), 400
+
+    payload = ingest_scheduler.snapshot()
+    if 'error' in payload:
+        return jsonify(payload)
+
+    etag = session_versions.etag(payload)
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    if query is not None:
+        page, next_cursor = session_query_index(payload).query(query)
+        # Index entries may predate this request; refresh their clock fields
+        now = datetime.now()
+        sessions_page = []
+        for session in page:
+            session = dict(session)
+            if session.get('last_activity_ms'):
+                set_time_since_fields(session, session['last_activity_ms'], now)
+            sessions_page.append(session)
+        payload = dict(payload, sessions=sessions_page, next_cursor=next_cursor)
+    else:
+        # ?since=<version>&epoch=<epoch> asks for only the sessions changed since
+        since = request.args.get('since', type=int)
+        if since is not None and request.args.get('epoch') == payload['epoch']:
+            payload = session_versions.delta_since(payload, since) or payload
+
+    if request.args.get('view') != 'full':
+        payload = summarize_payload(payload)
+    response = payload_response(payload)
+    response.set_etag(etag)
+    return response
+
+def session_records(session_path: str) -> Optional[Tuple[Dict[str, Any], Dict[str, MessageRecord]]]:
+    """Cached stats and per-file records of a local session.
+
+    Entries restored from the on-disk index have no records; they are parsed
+    once here and kept, so later drill-downs are served from memory. Frozen
+    (archived) sessions are parsed on demand and left frozen.
+    """
+    base = load_session_base(session_path)
+    if base is None:
+        return None
+    with _session_cache_lock:
+        entry = _session_cache.get(session_path)
+        if entry is None:
+            return None
+        if 'files' not in entry:
+            entry = session_store.load(session_path) if session_store is not None else None
+            if entry is None:
+                return None
+        records = entry['records']
+        files = list(entry['files'])
+    if records is None:
+        records = {}
+        for name in files:
+            record = load_message(os.path.join(session_path, name))
+            if record is not None:
+                records[name] = record
+        with _session_cache_lock:
+            if entry['records'] is None and not entry.get('frozen') and list(entry['files']) == files:
+                entry['records'] = records
+                if _session_cache.get(session_path) is entry:
+                    _touch_records(session_path, entry)
+    return base, records
+
+def message_timeline(records: Dict[str, MessageRecord]) -> List[Dict[str, Any]]:
+    timeline = []
+    for name, m in sorted(records.items(), key=lambda item: (item[1].created or 0, item[0])):
+        input_tokens, output_tokens, reasoning, cache_write, cache_read = m.tokens or (0, 0, 0, 0, 0)
+        latency = m.completed - m.created if m.completed and m.created and m.completed > m.created else None
+        timeline.append({
+            'id': name[:-len('.json')] if name.endswith('.json') else name,
+            'role': m.role,
+            'created': m.created,
+            'completed': m.completed,
+            'latency_ms': latency,
+            'model': m.model_id,
+            'agent': m.agent,
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'reasoning_tokens': reasoning,
+            'cache_read_tokens': cache_read,
+            'cache_write_tokens': cache_write,
+            'cost': m.cost,
+            'finish': m.finish,
+            'error': m.error,
+            'preview': m.preview
+        })
+    return timeline
+
+@app.route('/api/sessions/<session_id>')
+def session_detail(session_id: str):
+    """Full stats plus the per-message timeline of one session.
+
+    ?device=<id> selects a remote device (proxied to its agent); ?limit=N
+    returns only the latest N messages.
+    """
+    device_id = request.args.get('device', 'local')
+    limit = None
+    if request.args.get('limit'):
+        try:
+            limit = int(request.args['limit'])
+        except ValueError as e:
+            return jsonify({"error": f"invalid query: {e}"}), 400
+        if limit <= 0:
+            return jsonify({"error": "invalid query: limit must be positive"}), 400
+    device = None
+    if device_id != 'local':
+        device = next((d for d in load_config().get('devices', []) if d.get('id') == device_id), None)
+        if device is None:
+            device = rollup_registry.device(device_id)
+        if device is None:
+            return jsonify({"error": f"unknown device: {device_id}"}), 404
+    if device is not None and device.get('url', '') != 'local':
+        params = {'limit': limit} if limit else {}
+        try:
+            response = http_session.get(f"{device['url']}/api/sessions/{session_id}", params=params,
+                                        timeout=float(device.get('timeout', REMOTE_TIMEOUT)))
+            detail = response.json()
+        except (requests.RequestException, ValueError) as e:
+            return jsonify({"error": f"device {device_id} unreachable: {type(e).__name__}"}), 502
+        if not isinstance(detail, dict):
+            # e.g. an older agent's error body
+            return jsonify({"error": f"device {device_id} returned an invalid response"}), 502
+        if response.status_code == 200 and isinstance(detail.get('session'), dict):
+            detail['session'].update({'device_id': device_id, 'device_name': device.get('name', device_id)})
+        return jsonify(detail), response.status_code
+
+    if not session_id.startswith('ses_') or os.sep in session_id or '/' in session_id:
+        return jsonify({"error": "session not found"}), 404
+    result = session_records(os.path.join(DATA_DIR, session_id))
+    if result is None:
+        return jsonify({"error": "session not found"}), 404
+    base, records = result
+    session = apply_activity_fields(base)
+    session.update({'device_id': device_id, 'device_name': device.get('name', device_id) if device else '本地设备'})
+    messages = message_timeline(records)
+    if limit:
+        messages = messages[-limit:]
+    return jsonify({"session": session, "messages": messages, "message_total": len(records)})
+
+# Bulk export. /api/export streams the sessions of the current snapshot (or,
+# with ?records=messages, the per-message rows of local sessions) as NDJSON,
+# CSV, or Parquet / Arrow IPC when pyarrow is installed. Rows are generated
+# one at a time from the published snapshot and flushed in chunks, so memory
+# stays flat however much history matches and nothing holds a lock while
+# the client reads. Accepts the /api/sessions filters (from, to, device,
+# model, status, project).
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.stream'
+}
+EXPORT_CHUNK_SIZE = 64 * 1024
+EXPORT_BATCH_ROWS = 2000
+# Columns of the tabular formats with their types: s(tring), i(nt), f(loat), b(ool)
+EXPORT_SESSION_COLUMNS = (
+    ('device_id', 's'), ('device_name', 's'), ('id', 's'), ('name', 's'), ('status', 's'), ('model', 's'),
+    ('provider', 's'), ('agent', 's'), ('project_path', 's'), ('timestamp', 'i'), ('last_activity_ms', 'i'),
+    ('message_count', 'i'), ('interactions', 'i'), ('input_tokens', 'i'), ('output_tokens', 'i'),
+    ('reasoning_tokens', 'i'), ('cache_read_tokens', 'i'), ('cache_write_tokens', 'i'), ('total_tokens', 'i'),
+    ('cost_val', 'f'), ('estimated_cost_val', 'f'), ('files_changed', 'i'), ('lines_added', 'i'),
+    ('lines_deleted', 'i'), ('finish_reason', 's'), ('has_error', 'b')
+)
+EXPORT_MESSAGE_COLUMNS = (
+    ('device_id', 's'), ('session_id', 's'), ('id', 's'), ('role', 's'), ('created', 'i'), ('completed', 'i'),
+    ('latency_ms', 'i'), ('model', 's'), ('agent', 's'), ('input_tokens', 'i'), ('output_tokens', 'i'),
+    ('reasoning_tokens', 'i'), ('cache_read_tokens', 'i'), ('cache_write_tokens', 'i'), ('cost', 'f'),
+    ('finish', 's'), ('error', 'b'), ('preview', 's')
+)
+
+def iter_session_records(session_path: str) -> Dict[str, MessageRecord]:
+    """Records of one local session, from the cache or parsed without keeping them."""
+    with _session_cache_lock:
+        entry = _session_cache.get(session_path)
+        records = entry.get('records') if entry is not None else None
+    if records is not None:
+        return dict(records)
+    records = {}
+    for name in sorted(_scan_session_files(session_path) or {}):
+        record = load_message(os.path.join(session_path, name))
+        if record is not None:
+            records[name] = record
+    return records
+
+def export_rows(sessions: Any, messages: bool, start_ms: Optional[float] = None,
+                end_ms: Optional[float] = None) -> Any:
+    """Session rows, or message rows of the local sessions.
+
+    Session rows are already filtered by the query (from/to apply to the
+    session start). For message rows `start_ms`/`end_ms` select the sessions
+    whose activity overlaps the range and the messages created inside it.
+    """
+    for session in sessions:
+        if not messages:
+            yield {k: v for k, v in session.items() if not k.startswith('_') and k not in VOLATILE_SESSION_FIELDS}
+            continue
+        # Message files only exist here; remote devices export their own
+        if session.get('device_id', 'local') != 'local':
+            continue
+        if start_ms is not None and to_float(session.get('last_activity_ms')) < start_ms:
+            continue
+        if end_ms is not None and _session_timestamp(session) > end_ms:
+            continue
+        session_id = str(session.get('id', ''))
+        if not session_id.startswith('ses_') or os.sep in session_id:
+            continue
+        for row in message_timeline(iter_session_records(os.path.join(DATA_DIR, session_id))):
+            created = row.get('created') or 0
+            if start_ms is not None and created < start_ms or end_ms is not None and created > end_ms:
+                continue
+            row.update({'device_id': 'local', 'session_id': session_id})
+            yield row
+
+def export_text(rows: Any, fmt: str, columns: Tuple[Tuple[str, str], ...]) -> Any:
+    """NDJSON or CSV, yielded in chunks of about EXPORT_CHUNK_SIZE."""
+    buffer = io.StringIO()
+    writer = None
+    if fmt == 'csv':
+        writer = csv.DictWriter(buffer, fieldnames=[name for name, _ in columns], extrasaction='ignore')
+        writer.writeheader()
+    for row in rows:
+        if writer is not None:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(row, ensure_ascii=False, default=str))
+            buffer.write('\n')
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+class ExportSink:
+    """Write-only file object that hands its bytes back between batches."""
+
+    def __init__(self) -> None:
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data: Any) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def writable(self) -> bool:
+        return True
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def export_columnar(rows: Any, fmt: str, columns: Tuple[Tuple[str, str], ...]) -> Any:
+    """Parquet or Arrow IPC stream, one row group / record batch per EXPORT_BATCH_ROWS."""
+    # Only called when pyarrow imported
+    arrow, parquet = pa, pq
+    assert arrow is not None and parquet is not None
+    types = {'s': arrow.string(), 'i': arrow.int64(), 'f': arrow.float64(), 'b': arrow.bool_()}
+    coerce = {'s': lambda v: str(v), 'i': lambda v: int(to_float(v)), 'f': to_float, 'b': bool}
+    schema = arrow.schema([(name, types[kind]) for name, kind in columns])
+    sink = ExportSink()
+    writer = parquet.ParquetWriter(sink, schema) if fmt == 'parquet' else arrow.ipc.new_stream(sink, schema)
+
+    def write(batch: List[Dict[str, Any]]) -> None:
+        arrays = [
+            arrow.array([None if row.get(name) is None else coerce[kind](row[name]) for row in batch], type=types[kind])
+            for name, kind in columns
+        ]
+        writer.write_table(arrow.Table.from_arrays(arrays, schema=schema))
+
+    batch: List[Dict[str, Any]] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= EXPORT_BATCH_ROWS:
+            write(batch)
+            batch = []
+            yield sink.take()
+    if batch:
+        write(batch)
+    writer.close()
+    yield sink.take()
+
+def gzip_stream(chunks: Any) -> Any:
+    compressor = zlib.compressobj(5, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+@app.route('/api/export')
+def export():
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    if fmt in ('parquet', 'arrow') and pa is None:
+        return jsonify({"error": f"{fmt} export needs pyarrow installed"}), 400
+    messages = request.args.get('records', 'sessions') == 'messages'
+    try:
+        query = parse_session_query(request.args) or {}
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"invalid query: {e}"}), 400
+    for name in ('cursor', 'limit'):
+        query.pop(name, None)
+    # from/to filter sessions on their start time, but messages on their own
+    # time: a session started before `from` can still have messages after it
+    start_ms, end_ms = (query.pop('from', None), query.pop('to', None)) if messages else (None, None)
+
+    payload = ingest_scheduler.snapshot()
+    if 'error' in payload:
+        return jsonify(payload), 503
+    rows = export_rows(session_query_index(payload).iter(query), messages, start_ms, end_ms)
+    columns = EXPORT_MESSAGE_COLUMNS if messages else EXPORT_SESSION_COLUMNS
+    if fmt in ('parquet', 'arrow'):
+        body = export_columnar(rows, fmt, columns)
+    else:
+        body = export_text(rows, fmt, columns)
+    headers = {'Content-Disposition': f'attachment; filename="ocmonitor-{"messages" if messages else "sessions"}.{fmt}"'}
+    # Parquet and Arrow compress internally
+    if fmt in ('ndjson', 'csv') and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        body = gzip_stream(body)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(stream_with_context(body), mimetype=EXPORT_FORMATS[fmt], headers=headers)
+
+def merge_series(target: Dict[str, List[List[float]]], source: Dict[str, List[List[float]]]) -> None:
+    for name, points in source.items():
+        merged = {int(p[0]): list(p) for p in target.get(name, [])}
+        for p in points:
+            point = merged.setdefault(int(p[0]), [int(p[0]), 0, 0.0, 0])
+            point[1] += p[1]
+            point[2] += p[2]
+            point[3] += p[3]
+        target[name] = [merged[b] for b in sorted(merged)]
+
+@app.route('/api/timeseries')
+def timeseries():
+    resolution = request.args.get('resolution', 'hour')
+    group_by = request.args.get('group_by', 'model')
+    if resolution not in TIMESERIES_RESOLUTIONS:
+        return jsonify({"error": f"resolution must be one of {', '.join(TIMESERIES_RESOLUTIONS)}"}), 400
+    if group_by not in TIMESERIES_DIMENSIONS + ('none',):
+        return jsonify({"error": f"group_by must be one of {', '.join(TIMESERIES_DIMENSIONS)}, none"}), 400
+    try:
+        now_ms = time.time() * 1000
+        end_ms = parse_time_arg(request.args['to']) if request.args.get('to') else now_ms
+        start_ms = parse_time_arg(request.args['from']) if request.args.get('from') else end_ms - TIMESERIES_DEFAULT_SPAN[resolution]
+    except ValueError as e:
+        return jsonify({"error": f"invalid query: {e}"}), 400
+    filters = {
+        name: {v for v in request.args[name].split(',') if v}
+        for name in TIMESERIES_DIMENSIONS if request.args.get(name)
+    }
+
+    # Local sessions are folded into the rollups by each ingest
+    ingest_scheduler.snapshot()
+    local_filters = dict(filters)
+    if 'device' in local_filters and 'local' not in local_filters['device']:
+        series: Dict[str, List[List[float]]] = {}
+    else:
+        local_filters.pop('device', None)
+        series = timeseries_rollup.query(resolution, start_ms, end_ms, None if group_by == 'none' else group_by, local_filters)
+
+    # Remote devices report their own local rollups; fan them out unless asked not to
+    if request.args.get('scope') != 'local':
+        params = {k: v for k, v in request.args.items() if k not in ('device', 'scope')}
+        params.update({'scope': 'local', 'from': str(start_ms), 'to': str(end_ms), 'resolution': resolution, 'group_by': group_by})
+        fetches = []
+        for device in load_config().get('devices', []):
+            device_id = device.get('id', 'unknown')
+            device_url = device.get('url', '')
+            if not device.get('enabled', True) or device_url == 'local':
+                continue
+            if 'device' in filters and device_id not in filters['device']:
+                continue
+            if remote_device_state(device_url).circuit() == 'open':
+                continue
+            fetches.append((device_id, remote_pool.submit(
+                http_session.get, f"{device_url}/api/timeseries", params=params,
+                timeout=float(device.get('timeout', REMOTE_TIMEOUT))
+            )))
+        deadline = time.monotonic() + REMOTE_DEADLINE
+        for device_id, future in fetches:
+            try:
+                response = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                remote_series = response.json().get('series', {}) if response.status_code == 200 else {}
+            except Exception:
+                continue
+            if group_by == 'device':
+                remote_series = {device_id if name == 'local' else name: points for name, points in remote_series.items()}
+            merge_series(series, remote_series)
+
+    return jsonify({
+        "resolution": resolution,
+        "group_by": group_by,
+        "from": start_ms,
+        "to": end_ms,
+        "columns": ["timestamp", "tokens", "cost", "calls"],
+        "series": series
+    })
+
+# Live updates over Server-Sent Events. One producer diffs each snapshot the
+# ingest scheduler publishes and fans pre-serialized frames out to every
+# subscriber, so N open dashboards cost the same backend work as one.
+STREAM_INTERVAL = float(os.environ.get('AUTO_REFRESH_INTERVAL', '5'))
+STREAM_KEEPALIVE = 15.0
+STREAM_QUEUE_SIZE = 32
+
+def diff_payloads(old: Dict[str, Any], new: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Per-session diff between two payloads, or None when nothing changed."""
+    def comparable(session):
+        return {k: v for k, v in session.items() if k not in VOLATILE_SESSION_FIELDS}
+
+    old_sessions = {session_key(s): s for s in old.get('sessions', [])}
+    new_sessions = {session_key(s): s for s in new.get('sessions', [])}
+
+    added = [s for key, s in new_sessions.items() if key not in old_sessions]
+    changed = [
+        s for key, s in new_sessions.items()
+        if key in old_sessions and comparable(s) != comparable(old_sessions[key])
+    ]
+    removed = [key for key in old_sessions if key not in new_sessions]
+
+    diff: Dict[str, Any] = {}
+    if added:
+        diff['added'] = added
+    if changed:
+        diff['changed'] = changed
+    if removed:
+        diff['removed'] = removed
+    if new.get('metrics') != old.get('metrics'):
+        diff['metrics'] = new.get('metrics')
+    return diff or None
+
+def sse_frame(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+class SessionStream:
+    """Single producer shared by all /api/stream subscribers."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subscribers: List[queue.Queue] = []
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._snapshot_frame: Optional[str] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def subscribe(self) -> queue.Queue:
+        q: queue.Queue = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.append(q)
+            if self._snapshot_frame is not None:
+                q.put(self._snapshot_frame)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='session-stream', daemon=True)
+                self._thread.start()
+        return q
+
+    def unsubscribe(self, q: queue.Queue) -> None:
+        with self._lock:
+            if q in self._subscribers:
+                self._subscribers.remove(q)
+
+    def _broadcast(self, frame: str) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+            snapshot_frame = self._snapshot_frame
+        for q in subscribers:
+            try:
+                q.put_nowait(frame)
+            except queue.Full:
+                # Slow client: drop its backlog and resync it with a snapshot
+                while True:
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        break
+                if snapshot_frame is not None:
+                    q.put_nowait(snapshot_frame)
+
+    def _run(self) -> None:
+        seen: Optional[Dict[str, Any]] = None
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    # Nobody is watching: stop producing and forget the
+                    # snapshot so the next viewer starts from fresh data.
+                    self._thread = None
+                    self._snapshot = None
+                    self._snapshot_frame = None
+                    return
+                previous = self._snapshot
+
+            payload = ingest_scheduler.wait_newer(seen, STREAM_KEEPALIVE)
+            if payload is None:
+                continue
+            seen = payload
+            if 'error' not in payload:
+                snapshot_frame = sse_frame('snapshot', encode_compact_payload(summarize_payload(payload)))
+                with self._lock:
+                    self._snapshot = payload
+                    self._snapshot_frame = snapshot_frame
+                if previous is None:
+                    self._broadcast(snapshot_frame)
+                else:
+                    diff = diff_payloads(previous, payload)
+                    if diff is not None:
+                        self._broadcast(sse_frame('diff', encode_compact_payload(summarize_payload(diff))))
+
+session_stream = SessionStream()
+
+@app.route('/api/stream')
+def stream():
+    q = session_stream.subscribe()
+
+    def generate():
+        try:
+            yield f"retry: {int(STREAM_INTERVAL * 1000)}\n\n"
+            while True:
+                try:
+                    yield q.get(timeout=STREAM_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            session_stream.unsubscribe(q)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+# Serving. The default server is waitress: multi-threaded in a single
+# process, so all viewers and agents share one session cache and one ingest
+# scheduler. Each open /api/stream holds a thread, hence the generous pool.
+# DASHBOARD_SERVER=dev runs the Flask development server with the reloader.
+# Under gunicorn, use a single worker with threads (-w 1 --threads N) for the
+# same reason.
+DASHBOARD_HOST = os.environ.get('DASHBOARD_HOST', '0.0.0.0')
+DASHBOARD_PORT = int(os.environ.get('DASHBOARD_PORT', '38002'))
+DASHBOARD_SERVER = os.environ.get('DASHBOARD_SERVER', 'waitress')
+DASHBOARD_THREADS = int(os.environ.get('DASHBOARD_THREADS', '32'))
+
+def serve() -> None:
+    # The dev server's reloader parent only supervises; push from the child
+    if rollup_pusher is not None and (DASHBOARD_SERVER != 'dev' or os.environ.get('WERKZEUG_RUN_MAIN')):
+        rollup_pusher.start()
+    if DASHBOARD_SERVER == 'waitress':
+        try:
+            import waitress  # type: ignore
+        except ImportError:
+            app.logger.warning("waitress is not installed, falling back to the development server")
+        else:
+            # send_bytes=1 flushes every write, so SSE frames are not held back
+            waitress.serve(app, host=DASHBOARD_HOST, port=DASHBOARD_PORT, threads=DASHBOARD_THREADS,
+                           send_bytes=1, ident='ocmonitor')
+            return
+    app.run(host=DASHBOARD_HOST, port=DASHBOARD_PORT, debug=DASHBOARD_SERVER == 'dev', threaded=True)
+
 if __name__ == '__main__':
-    # Run on 0.0.0.0:38002
-    app.run(host='0.0.0.0', port=38002, debug=True)
+    serve()
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""Benchmark the dashboard against synthetic OpenCode storage.
+
+Generates a reproducible ses_* tree (session count, messages per session,
+message size and the model/agent/finish/error mix are configurable), starts
+stub agents serving /api/sessions, and times:
+
+  cold_scan       full payload build with empty caches
+  warm_ingest     payload build with nothing changed
+  warm_request    GET /api/sessions served from the published snapshot
+  session_update  get_session_stats after appending a message to a session
+  multi_device    payload build with the stub agents configured
+
+and reports p50/p90/p99/max latency and peak RSS: the stage's own peak where
+the kernel lets it be reset (Linux), the process-wide high-water mark, and
+the largest parse worker process. Results can be written as
+JSON and compared against a previous run to catch regressions:
+
+  python scripts/benchmark.py --sessions 2000 --messages 60 --json bench.json
+  python scripts/benchmark.py --sessions 2000 --messages 60 --baseline bench.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import resource
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+MODELS = ['claude-sonnet-4', 'claude-opus-4', 'gemini-2.5-pro', 'gpt-4o', 'deepseek-chat']
+AGENTS = ['build', 'plan', 'general']
+FINISH_REASONS = ['stop', 'tool-calls', 'tool-calls', 'tool-calls', 'length']
+
+def generate_storage(root: str, sessions: int, messages: int, message_bytes: int,
+                     error_rate: float, active_ratio: float, seed: int) -> int:
+    """Write a synthetic message tree under root; returns the bytes written."""
+    rng = random.Random(seed)
+    now_ms = int(time.time() * 1000)
+    written = 0
+    for i in range(sessions):
+        session_id = f"ses_bench{i:07d}"
+        session_dir = os.path.join(root, session_id)
+        os.makedirs(session_dir, exist_ok=True)
+        # A share of sessions is still running; the rest spread over 90 days
+        if rng.random() < active_ratio:
+            t = now_ms - messages * 30000
+        else:
+            t = now_ms - rng.randint(86400000, 90 * 86400000)
+        model = rng.choice(MODELS)
+        agent = rng.choice(AGENTS)
+        for j in range(messages):
+            role = 'user' if j % 2 == 0 else 'assistant'
+            m: Dict[str, Any] = {
+                'id': f"msg_{j:06d}",
+                'sessionID': session_id,
+                'role': role,
+                'time': {'created': t},
+                'agent': agent
+            }
+            if role == 'user':
+                m['model'] = {'providerID': 'bench', 'modelID': model}
+                m['summary'] = {'title': f"Benchmark task {i}"} if j == 0 else {
+                    'files': rng.randint(0, 3), 'additions': rng.randint(0, 80), 'deletions': rng.randint(0, 40)
+                }
+            else:
+                if rng.random() < 0.2:
+                    model = rng.choice(MODELS)
+                m.update({
+                    'modelID': model,
+                    'providerID': 'bench',
+                    'path': {'cwd': f"/home/bench/project{i % 17}", 'root': '/'},
+                    'cost': round(rng.random() * 0.05, 6),
+                    'tokens': {
+                        'input': rng.randint(0, 8000),
+                        'output': rng.randint(0, 3000),
+                        'reasoning': rng.randint(0, 500),
+                        'cache': {'read': rng.randint(0, 150000), 'write': rng.randint(0, 5000)}
+                    },
+                    'finish': rng.choice(FINISH_REASONS)
+                })
+                m['time']['completed'] = t + rng.randint(200, 30000)
+                if rng.random() < error_rate:
+                    m['error'] = {'name': 'APIError', 'data': {'message': 'synthetic failure'}}
+            # Padding stands in for embedded tool output
+            m['text'] = 'x' * max(0, int(rng.gauss(message_bytes, message_bytes / 4)))
+            t += rng.randint(1000, 60000)
+            data = json.dumps(m)
+            with open(os.path.join(session_dir, f"msg_{j:06d}.json"), 'w') as f:
+                f.write(data)
+            written += len(data)
+    return written
+
+class StubAgent:
+    """A stub device agent serving a fixed /api/sessions payload."""
+
+    def __init__(self, body: bytes, latency: float) -> None:
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if latency:
+                    time.sleep(latency)
+                if not self.path.startswith('/api/sessions'):
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+# Resetting VmHWM also resets ru_maxrss, so the process-wide peak is carried here
+_process_peak_mb = 0.0
+
+def peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    """Peak RSS of this process (or of its largest reaped child)."""
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    peak_mb = peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    return max(peak_mb, _process_peak_mb) if who == resource.RUSAGE_SELF else peak_mb
+
+def reset_stage_peak() -> None:
+    """Reset the kernel's peak RSS counter (VmHWM) where that is supported."""
+    global _process_peak_mb
+    _process_peak_mb = peak_rss_mb()
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def stage_peak_rss_mb() -> Optional[float]:
+    """Peak RSS since the last reset_stage_peak, or None off Linux."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def measure(name: str, runs: int, fn, setup=None) -> Dict[str, Any]:
+    samples = []
+    reset_stage_peak()
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    result = {
+        'runs': runs,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p90_ms': percentile(samples, 90) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'max_ms': max(samples) * 1000
+    }
+    stage = stage_peak_rss_mb()
+    result['stage_peak_rss_mb'] = stage
+    result['process_peak_rss_mb'] = max(peak_rss_mb(), stage or 0.0)
+    result['worker_peak_rss_mb'] = peak_rss_mb(resource.RUSAGE_CHILDREN)
+    print(f"{name:<16} p50 {result['p50_ms']:9.2f}ms  p90 {result['p90_ms']:9.2f}ms  "
+          f"p99 {result['p99_ms']:9.2f}ms  max {result['max_ms']:9.2f}ms  "
+          f"rss stage {'n/a' if stage is None else f'{stage:.1f}MB'} / process {result['process_peak_rss_mb']:.1f}MB"
+          f" / workers {result['worker_peak_rss_mb']:.1f}MB")
+    return result
+
+def compare(results: Dict[str, Any], baseline_path: str, threshold: float) -> int:
+    """Print p50 changes against a baseline; returns the number of regressions."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']
+    regressions = 0
+    print(f"\nagainst {baseline_path} (regression threshold {threshold:.0%}):")
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None or not before['p50_ms']:
+            continue
+        change = result['p50_ms'] / before['p50_ms'] - 1
+        regressed = change > threshold
+        regressions += regressed
+        print(f"{name:<16} p50 {before['p50_ms']:9.2f}ms -> {result['p50_ms']:9.2f}ms  {change:+7.1%}"
+              f"{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=500)
+    parser.add_argument('--messages', type=int, default=40, help='messages per session')
+    parser.add_argument('--message-bytes', type=int, default=2000, help='mean padding per message')
+    parser.add_argument('--error-rate', type=float, default=0.03)
+    parser.add_argument('--active-ratio', type=float, default=0.05, help='share of sessions still running')
+    parser.add_argument('--devices', type=int, default=4, help='stub agents for multi_device')
+    parser.add_argument('--device-latency', type=float, default=0.0, help='stub response delay in seconds')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--cold-runs', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--dir', help='reuse or keep the synthetic tree here')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--baseline', help='compare against a previous --json file')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed p50 slowdown vs the baseline')
+    args = parser.parse_args()
+
+    workdir = args.dir or tempfile.mkdtemp(prefix='ocmonitor-bench-')
+    data_dir = os.path.join(workdir, 'message')
+    stub_dir = os.path.join(workdir, 'stub-message')
+    if not os.path.isdir(data_dir):
+        started = time.perf_counter()
+        written = generate_storage(data_dir, args.sessions, args.messages, args.message_bytes,
+                                   args.error_rate, args.active_ratio, args.seed)
+        generate_storage(stub_dir, max(1, args.sessions // 4), args.messages, args.message_bytes,
+                         args.error_rate, args.active_ratio, args.seed + 1)
+        print(f"generated {args.sessions} x {args.messages} messages ({written / 1e6:.1f} MB) "
+              f"in {time.perf_counter() - started:.1f}s under {workdir}")
+
+    # The app reads its settings at import time
+    os.environ['OPENCODE_DATA_DIR'] = data_dir
+    os.environ['DASHBOARD_INDEX_DB'] = ''
+    os.environ['DASHBOARD_WATCH'] = '0'
+    # Keep the background ingest out of the measurements
+    os.environ['DASHBOARD_INGEST_ACTIVE_INTERVAL'] = '3600'
+    os.environ['DASHBOARD_INGEST_IDLE_INTERVAL'] = '3600'
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import app as dashboard
+    # Spawned parse workers are our own children (forkserver ones are not),
+    # so their peak RSS shows up in RUSAGE_CHILDREN once they are reaped
+    dashboard.PARSE_START_METHOD = 'spawn'
+
+    config_path = os.path.join(workdir, 'dashboard-config.json')
+    local_device = {'id': 'local', 'name': 'local', 'url': 'local', 'enabled': True}
+
+    def use_devices(devices: List[Dict[str, Any]]) -> None:
+        with open(config_path, 'w') as f:
+            json.dump({'devices': devices}, f)
+        dashboard.CONFIG_FILE = config_path
+
+    def reset_caches() -> None:
+        with dashboard._session_cache_lock:
+            dashboard._session_cache.clear()
+            dashboard._record_lru.clear()
+            dashboard._record_lru_total = 0
+            dashboard._last_archive_sweep = 0.0
+            dashboard._last_idle_check = 0.0
+            dashboard.timeseries_rollup = dashboard.TimeseriesRollup()
+        dashboard.session_aggregates = dashboard.SessionAggregates()
+        dashboard.session_versions = dashboard.SessionVersions()
+        dashboard._query_index = None
+        dashboard._summary_cache = None
+
+    use_devices([local_device])
+    results = {}
+    results['cold_scan'] = measure('cold_scan', args.cold_runs, dashboard.build_sessions_payload, reset_caches)
+    results['warm_ingest'] = measure('warm_ingest', args.runs, dashboard.build_sessions_payload)
+
+    client = dashboard.app.test_client()
+    client.get('/api/sessions')
+    results['warm_request'] = measure('warm_request', args.runs, lambda: client.get('/api/sessions'))
+
+    session_dirs = sorted(os.path.join(data_dir, d) for d in os.listdir(data_dir) if d.startswith('ses_'))
+    target = session_dirs[len(session_dirs) // 2]
+    counter = [0]
+
+    def append_message() -> None:
+        counter[0] += 1
+        message = {
+            'id': f"msg_bench_update{counter[0]:06d}", 'role': 'assistant',
+            'time': {'created': int(time.time() * 1000), 'completed': int(time.time() * 1000) + 500},
+            'modelID': MODELS[0], 'providerID': 'bench', 'agent': AGENTS[0], 'finish': 'stop', 'cost': 0.01,
+            'tokens': {'input': 100, 'output': 50, 'reasoning': 0, 'cache': {'read': 0, 'write': 0}}
+        }
+        with open(os.path.join(target, f"msg_update{counter[0]:06d}.json"), 'w') as f:
+            json.dump(message, f)
+
+    results['session_update'] = measure('session_update', args.runs,
+                                        lambda: dashboard.get_session_stats(target), append_message)
+    # Leave a reused tree as generated
+    for name in os.listdir(target):
+        if name.startswith('msg_update'):
+            os.remove(os.path.join(target, name))
+
+    stubs = []
+    if args.devices:
+        # Stub agents serve a real payload built from their own synthetic tree
+        dashboard.DATA_DIR = stub_dir
+        reset_caches()
+        stub_body = json.dumps(dashboard.build_sessions_payload()).encode()
+        dashboard.DATA_DIR = data_dir
+        reset_caches()
+        dashboard.build_sessions_payload()
+        stubs = [StubAgent(stub_body, args.device_latency) for _ in range(args.devices)]
+        use_devices([local_device] + [
+            {'id': f"stub{i}", 'name': f"stub{i}", 'url': stub.url, 'enabled': True}
+            for i, stub in enumerate(stubs)
+        ])
+        dashboard.build_sessions_payload()
+        results['multi_device'] = measure('multi_device', args.runs, dashboard.build_sessions_payload)
+        for stub in stubs:
+            stub.close()
+
+    report = {
+        'params': {k: v for k, v in vars(args).items() if k not in ('dir', 'json', 'baseline')},
+        'results': results
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    regressions = compare(results, args.baseline, args.threshold) if args.baseline else 0
+    if not args.dir:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,7 @@
 #!/bin/bash
 # Install dependencies if not present (simple check)
-if ! python3 -c "import flask" &> /dev/null; then
-    echo "Flask not found. Installing requirements..."
+if ! python3 -c "import flask, waitress" &> /dev/null; then
+    echo "Dependencies not found. Installing requirements..."
     pip install -r requirements.txt
 fi
 